@@ -1,7 +1,10 @@
 """API dependencies."""
 
 from fastapi import Depends
+from sqlalchemy.orm import Session
+from core.config import settings
 from core.security import get_current_user
+from db.database import ReadSessionLocal, get_db, read_engine, engine, replica_lag_monitor
 from models.user import User
 
 def get_current_active_user(
@@ -10,3 +13,19 @@ def get_current_active_user(
     """Get current active user dependency."""
     return current_user
 
+def get_redirect_db(db: Session = Depends(get_db)):
+    """Session for redirect lookups: the replica unless it lags too much, otherwise the primary."""
+    use_replica = (
+        settings.REDIRECT_FROM_REPLICA
+        and read_engine is not engine
+        and replica_lag_monitor.lag_seconds() <= settings.REPLICA_MAX_LAG_SECONDS
+    )
+    if not use_replica:
+        yield db
+        return
+    
+    read_db = ReadSessionLocal()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
@@ -1,32 +1,95 @@
 """Link management endpoints."""
 
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from api.deps import get_current_active_user
-from db.database import get_db
+from db.database import get_db, get_read_db
 from models.user import User
+from services.idempotency import IdempotencyConflict, IdempotencyService, request_hash
 from services.link_service import LinkService
-from schemas.link import LinkCreate, LinkResponse, LinkUpdate, PaginatedLinksResponse
+from schemas.link import (
+    LinkCreate,
+    LinkResponse,
+    LinkUpdate,
+    LinkBulkUpdate,
+    LinkBulkUpdateResponse,
+    PaginatedLinksResponse,
+)
 
 router = APIRouter()
 
+def _claim_idempotency_key(db: Session, username: str, key: str, body_hash: str) -> Optional[JSONResponse]:
+    """Claim a key for this request, or return the replayed response of an earlier request."""
+    try:
+        stored = IdempotencyService.claim(db, username, key, body_hash)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if stored is None:
+        return None
+    return JSONResponse(stored.body, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
 @router.post("/", response_model=LinkResponse, status_code=status.HTTP_201_CREATED)
 def create_link(
     link_data: LinkCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new shortened link."""
+    """Create a new shortened link.
+    
+    With reuse_existing an existing active link to the same URL is returned
+    with status 200. Retries sent with the same Idempotency-Key header get the
+    response of the first request.
+    """
+    username = current_user.username
+    if idempotency_key:
+        body_hash = request_hash(link_data.model_dump(mode="json"))
+        stored = _claim_idempotency_key(db, username, idempotency_key, body_hash)
+        if stored is not None:
+            return stored
+    
     try:
-        link = LinkService.create_link(db, link_data, current_user.username)
-        return link
+        link = None
+        if link_data.reuse_existing:
+            link = LinkService.find_reusable_link(db, username, link_data.original_url)
+        response.status_code = status.HTTP_201_CREATED if link is None else status.HTTP_200_OK
+        if link is None:
+            link = LinkService.create_link(db, link_data, username)
+        
+        # The response is stored in the transaction creating the link
+        completed = True
+        if idempotency_key:
+            body = LinkResponse.model_validate(link).model_dump(mode="json")
+            completed = IdempotencyService.complete(
+                db, username, idempotency_key, body_hash, response.status_code, body
+            )
+        if completed:
+            db.commit()
+        else:
+            db.rollback()
     except Exception as e:
+        if idempotency_key:
+            IdempotencyService.release(db, username, idempotency_key)
+        else:
+            db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create link: {str(e)}"
         )
+    
+    if not completed:
+        # A retry took the key over and finished first, its link is the one kept
+        stored = _claim_idempotency_key(db, username, idempotency_key, body_hash)
+        if stored is None:
+            IdempotencyService.release(db, username, idempotency_key)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="A request with this Idempotency-Key is in progress")
+        return stored
+    return link
 
 @router.get("/", response_model=PaginatedLinksResponse)
 def list_links(
@@ -34,7 +97,7 @@ def list_links(
     page_size: int = Query(10, ge=1, le=100, description="Number of items per page"),
     active: Optional[bool] = Query(None, description="Filter by active status"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List user's links with pagination and filtering."""
     try:
@@ -49,6 +112,22 @@ def list_links(
             detail=f"Failed to retrieve links: {str(e)}"
         )
 
+@router.patch("/", response_model=LinkBulkUpdateResponse)
+def bulk_update_links(
+    bulk_update: LinkBulkUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Update status or expiration of many of the user's links, selected by short URLs or a filter."""
+    try:
+        updated, not_found = LinkService.bulk_update_links(db, current_user.username, bulk_update)
+        return LinkBulkUpdateResponse(updated=updated, not_found=not_found)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to update links: {str(e)}"
+        )
+
 @router.get("/{short_url}", response_model=LinkResponse)
 def get_link(
     short_url: str,
@@ -1,12 +1,15 @@
 """Statistics endpoints."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from api.deps import get_current_active_user
-from db.database import get_db
+from core.config import settings
+from db.database import get_read_db
 from models.user import User
+from services.leaderboard import leaderboard
 from services.link_service import LinkService
 from schemas.link import LinkStats
 
@@ -14,13 +17,27 @@ router = APIRouter()
 
 @router.get("/", response_model=List[LinkStats])
 def get_all_stats(
-    db: Session = Depends(get_db)
+    response: Response,
+    db: Session = Depends(get_read_db)
 ):
-    """Get click statistics for all links, ordered by popularity."""
+    """Get click statistics for all links, ordered by popularity.
+
+    Served from the leaderboard snapshot while it is fresh enough, from a
+    live query otherwise. ``as_of`` and the ``X-Stats-As-Of`` header tell
+    up to when clicks are counted.
+    """
     try:
-        enhanced_stats = LinkService.get_all_enhanced_stats(db)
+        snapshot = None
+        if settings.LEADERBOARD_REFRESH_INTERVAL_SECONDS > 0:
+            snapshot = leaderboard.snapshot(settings.LEADERBOARD_MAX_STALENESS_SECONDS)
+        if snapshot is not None:
+            as_of, enhanced_stats = snapshot
+        else:
+            as_of = datetime.now(timezone.utc).replace(tzinfo=None)
+            enhanced_stats = LinkService.get_all_enhanced_stats(db)
         
-        return [LinkStats(**stats) for stats in enhanced_stats]
+        response.headers["X-Stats-As-Of"] = as_of.isoformat()
+        return [LinkStats(**stats, as_of=as_of) for stats in enhanced_stats]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -30,10 +47,17 @@ def get_all_stats(
 @router.get("/{short_url}", response_model=LinkStats)
 def get_link_stats(
     short_url: str,
-    db: Session = Depends(get_db)
+    windows: Optional[str] = Query(None, description="Comma separated windows such as 15m,1h,24h,7d"),
+    db: Session = Depends(get_read_db)
 ):
-    """Get statistics for a specific link."""
-    enhanced_stats = LinkService.get_enhanced_link_stats(db, short_url)
+    """Get statistics for a specific link, with clicks per requested window."""
+    try:
+        enhanced_stats = LinkService.get_enhanced_link_stats(db, short_url, windows)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     if not enhanced_stats:
         raise HTTPException(
@@ -7,6 +7,15 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Optional read replica for listings and statistics, the primary is used when empty
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    # Redirect lookups fall back to the primary when the replica lags more than this
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL_SECONDS", "2"))
+    REDIRECT_FROM_REPLICA: bool = os.getenv("REDIRECT_FROM_REPLICA", "true").lower() == "true"
+    # Schema handling on startup: "create" (create missing tables),
+    # "verify" (fail if tables/columns are missing, never alter) or "skip"
+    DB_SCHEMA_MODE: str = os.getenv("DB_SCHEMA_MODE", "create").lower()
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY")
@@ -21,6 +30,89 @@ class Settings:
     SHORT_URL_LENGTH: int = 8
     DEFAULT_LINK_EXPIRY_DAYS: int = 1
     
+    # Redirect cache
+    REDIRECT_CACHE_SIZE: int = int(os.getenv("REDIRECT_CACHE_SIZE", "10000"))
+    REDIRECT_CACHE_TTL_SECONDS: int = int(os.getenv("REDIRECT_CACHE_TTL_SECONDS", "300"))
+    CACHE_WARMUP_TOP_N: int = int(os.getenv("CACHE_WARMUP_TOP_N", "1000"))  # Most clicked links
+    CACHE_WARMUP_RECENT_N: int = int(os.getenv("CACHE_WARMUP_RECENT_N", "200"))  # Newest links
+    
+    # Click counting
+    CLICK_COUNTER_SHARDS: int = int(os.getenv("CLICK_COUNTER_SHARDS", "16"))
+    CLICK_FOLD_INTERVAL_SECONDS: int = int(os.getenv("CLICK_FOLD_INTERVAL_SECONDS", "10"))
+    CLICK_FOLD_BATCH_SIZE: int = int(os.getenv("CLICK_FOLD_BATCH_SIZE", "1000"))
+    USER_AGENT_CACHE_SIZE: int = int(os.getenv("USER_AGENT_CACHE_SIZE", "10000"))
+    
+    # Purging of deleted links
+    LINK_PURGE_INTERVAL_SECONDS: int = int(os.getenv("LINK_PURGE_INTERVAL_SECONDS", "30"))
+    LINK_PURGE_BATCH_SIZE: int = int(os.getenv("LINK_PURGE_BATCH_SIZE", "5000"))
+    # Let the database cascade deletes when every foreign key has ON DELETE CASCADE
+    LINK_PURGE_USE_DB_CASCADE: bool = os.getenv("LINK_PURGE_USE_DB_CASCADE", "false").lower() == "true"
+    
+    # Click retention: raw clicks older than this many days (at least 31) become daily aggregates
+    CLICK_RETENTION_DAYS: int = int(os.getenv("CLICK_RETENTION_DAYS", "90"))
+    CLICK_RETENTION_INTERVAL_SECONDS: int = int(os.getenv("CLICK_RETENTION_INTERVAL_SECONDS", "3600"))
+    CLICK_RETENTION_BATCH_SIZE: int = int(os.getenv("CLICK_RETENTION_BATCH_SIZE", "10000"))
+    # Drop whole daily partitions when clicks is a partitioned Postgres table
+    CLICK_PARTITIONING: bool = os.getenv("CLICK_PARTITIONING", "false").lower() == "true"
+    CLICK_PARTITION_DAYS_AHEAD: int = int(os.getenv("CLICK_PARTITION_DAYS_AHEAD", "7"))
+    
+    # Idempotency-Key support for link creation
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+    # A key still in progress after this long is taken over by a retry
+    IDEMPOTENCY_LOCK_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: int = int(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", "3600"))
+    
+    # Columnar click export, the background job is disabled when CLICK_EXPORT_DIR is empty
+    CLICK_EXPORT_DIR: str = os.getenv("CLICK_EXPORT_DIR", "")
+    CLICK_EXPORT_INTERVAL_SECONDS: int = int(os.getenv("CLICK_EXPORT_INTERVAL_SECONDS", "300"))
+    CLICK_EXPORT_BATCH_SIZE: int = int(os.getenv("CLICK_EXPORT_BATCH_SIZE", "50000"))
+    CLICK_EXPORT_SAFETY_LAG_SECONDS: int = int(os.getenv("CLICK_EXPORT_SAFETY_LAG_SECONDS", "60"))
+    
+    # Materialized /api/stats leaderboard, a refresh interval of 0 serves every call from the live query
+    LEADERBOARD_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("LEADERBOARD_REFRESH_INTERVAL_SECONDS", "5"))
+    LEADERBOARD_MAX_STALENESS_SECONDS: int = int(os.getenv("LEADERBOARD_MAX_STALENESS_SECONDS", "30"))
+    LEADERBOARD_REBUILD_INTERVAL_SECONDS: int = int(os.getenv("LEADERBOARD_REBUILD_INTERVAL_SECONDS", "3600"))
+    LEADERBOARD_SAFETY_LAG_SECONDS: int = int(os.getenv("LEADERBOARD_SAFETY_LAG_SECONDS", "2"))
+    LEADERBOARD_BATCH_SIZE: int = int(os.getenv("LEADERBOARD_BATCH_SIZE", "10000"))
+    
+    # Authentication cache, 0 disables caching of verified credentials
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    
+    # Cache invalidation across workers: inprocess, unix or postgres
+    INVALIDATION_BACKEND: str = os.getenv("INVALIDATION_BACKEND", "inprocess").lower()
+    INVALIDATION_SOCKET_DIR: str = os.getenv("INVALIDATION_SOCKET_DIR", "/tmp/url-alias-invalidation")
+    INVALIDATION_CHANNEL: str = os.getenv("INVALIDATION_CHANNEL", "url_alias_invalidation")
+    
+    # Token bucket rate limits per client, a rate of 0 disables the limit
+    REDIRECT_RATE_LIMIT_PER_SECOND: float = float(os.getenv("REDIRECT_RATE_LIMIT_PER_SECOND", "20"))
+    REDIRECT_RATE_LIMIT_BURST: float = float(os.getenv("REDIRECT_RATE_LIMIT_BURST", "100"))
+    CREATE_RATE_LIMIT_PER_SECOND: float = float(os.getenv("CREATE_RATE_LIMIT_PER_SECOND", "2"))
+    CREATE_RATE_LIMIT_BURST: float = float(os.getenv("CREATE_RATE_LIMIT_BURST", "20"))
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    
+    # Adaptive concurrency limit of database-bound requests, excess requests get 503
+    LOAD_SHEDDING_ENABLED: bool = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() == "true"
+    LOAD_SHEDDING_INITIAL_LIMIT: float = float(os.getenv("LOAD_SHEDDING_INITIAL_LIMIT", "20"))
+    LOAD_SHEDDING_MIN_LIMIT: float = float(os.getenv("LOAD_SHEDDING_MIN_LIMIT", "4"))
+    LOAD_SHEDDING_MAX_LIMIT: float = float(os.getenv("LOAD_SHEDDING_MAX_LIMIT", "200"))
+    LOAD_SHEDDING_LATENCY_TOLERANCE: float = float(os.getenv("LOAD_SHEDDING_LATENCY_TOLERANCE", "2.0"))
+    LOAD_SHEDDING_BACKOFF: float = float(os.getenv("LOAD_SHEDDING_BACKOFF", "0.9"))
+    # Fractions of the limit available to non-redirect API calls and to statistics and listings
+    LOAD_SHEDDING_CRUD_SHARE: float = float(os.getenv("LOAD_SHEDDING_CRUD_SHARE", "0.8"))
+    LOAD_SHEDDING_STATS_SHARE: float = float(os.getenv("LOAD_SHEDDING_STATS_SHARE", "0.5"))
+    LOAD_SHEDDING_RETRY_AFTER_SECONDS: int = int(os.getenv("LOAD_SHEDDING_RETRY_AFTER_SECONDS", "1"))
+    
+    # Request profiling: a fraction of requests, and requests whose X-Profile header equals PROFILE_TOKEN
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_MODE: str = os.getenv("PROFILE_MODE", "sampling").lower()  # sampling or cprofile
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "/tmp/url-alias-profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "100"))
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    # Fraction of wall time profiling may cost, with up to a minute of it saved up
+    PROFILE_MAX_OVERHEAD: float = float(os.getenv("PROFILE_MAX_OVERHEAD", "0.02"))
+    
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
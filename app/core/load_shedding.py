@@ -0,0 +1,174 @@
+"""Adaptive concurrency limiting of database-bound requests.
+
+``LoadSheddingMiddleware`` admits requests while fewer than an adaptive limit
+are in flight and rejects the rest at once with 503 and ``Retry-After``,
+instead of letting them queue on the connection pool until they time out.
+
+The limit follows AIMD: it shrinks by ``LOAD_SHEDDING_BACKOFF`` when the
+short-term query latency average rises above ``LOAD_SHEDDING_LATENCY_TOLERANCE``
+times the long-term one (the gradient signal), or when every pool connection
+is checked out so new requests would wait on the pool. It grows by about one
+request per round trip while it is fully used and neither signal fires.
+
+Requests are classified before routing. Redirects may use the whole limit,
+other API calls ``LOAD_SHEDDING_CRUD_SHARE`` of it and statistics and listings
+``LOAD_SHEDDING_STATS_SHARE``, so the cheaper and more important work is shed
+last. Redirects answered from the redirect cache bypass the limiter.
+"""
+
+import json
+import threading
+import time
+from typing import Optional
+
+from core.config import settings
+from core.rate_limit import REDIRECT_PATH
+from db.database import engine, read_engine
+from db.instrumentation import add_query_observer, remove_query_observer
+from services.cache import redirect_cache
+from services.urls import RESERVED_PATHS
+
+REDIRECT = "redirect"
+CRUD = "crud"
+STATS = "stats"
+
+def pool_saturation(*engines) -> float:
+    """Highest fraction of pool capacity checked out across engines, 0 for pools without a bound."""
+    saturation = 0.0
+    for bound_engine in engines:
+        pool = bound_engine.pool
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        if not hasattr(pool, "checkedout") or max_overflow < 0:
+            continue
+        saturation = max(saturation, pool.checkedout() / max(pool.size() + max_overflow, 1))
+    return saturation
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit driven by query latency and pool saturation."""
+
+    def __init__(self, initial_limit: float, min_limit: float, max_limit: float,
+                 latency_tolerance: float = 2.0, backoff: float = 0.9,
+                 shares: Optional[dict] = None, saturation=lambda: 0.0):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.shares = shares or {REDIRECT: 1.0, CRUD: 1.0, STATS: 1.0}
+        self.saturation = saturation
+        self.in_flight = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def observe_query(self, seconds: float) -> None:
+        """Update the short and long term query latency averages."""
+        with self._lock:
+            if self.short_latency is None:
+                self.short_latency = self.long_latency = seconds
+                return
+            self.short_latency += 0.2 * (seconds - self.short_latency)
+            self.long_latency += 0.01 * (seconds - self.long_latency)
+
+    def overloaded(self) -> bool:
+        """Whether latency rose well above its long-term level or the pool is exhausted."""
+        with self._lock:
+            slow = (self.short_latency is not None
+                    and self.short_latency > self.long_latency * self.latency_tolerance)
+        return slow or self.saturation() >= 1.0
+
+    def try_acquire(self, priority: str) -> bool:
+        """Admit a request of a priority class if its share of the limit has room."""
+        if self.in_flight >= max(self.limit * self.shares[priority], 1.0):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, now: Optional[float] = None) -> None:
+        """Finish an admitted request and adapt the limit."""
+        now = time.monotonic() if now is None else now
+        fully_used = self.in_flight >= self.limit - 1
+        self.in_flight -= 1
+        if self.overloaded():
+            # At most one decrease per round trip, so one slow burst does not collapse the limit
+            if now - self._last_decrease >= max(self.short_latency or 0.0, 0.05):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif fully_used:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Priority class of a request, None for requests that are never limited."""
+    if path in RESERVED_PATHS:
+        return None
+    if path.startswith("/api/stats") or (method == "GET" and path in ("/api/links", "/api/links/")):
+        return STATS
+    if path.startswith("/api/"):
+        return CRUD
+    if method == "GET" and REDIRECT_PATH.match(path):
+        return REDIRECT
+    return None
+
+class LoadSheddingMiddleware:
+    """ASGI middleware rejecting requests over the adaptive concurrency limit with 503."""
+
+    def __init__(self, app):
+        self.app = app
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=settings.LOAD_SHEDDING_INITIAL_LIMIT,
+            min_limit=settings.LOAD_SHEDDING_MIN_LIMIT,
+            max_limit=settings.LOAD_SHEDDING_MAX_LIMIT,
+            latency_tolerance=settings.LOAD_SHEDDING_LATENCY_TOLERANCE,
+            backoff=settings.LOAD_SHEDDING_BACKOFF,
+            shares={
+                REDIRECT: 1.0,
+                CRUD: settings.LOAD_SHEDDING_CRUD_SHARE,
+                STATS: settings.LOAD_SHEDDING_STATS_SHARE,
+            },
+            saturation=lambda: pool_saturation(engine, read_engine),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._observe_lifespan(receive), send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = classify(scope["method"], scope["path"])
+        if priority is None or (priority == REDIRECT and redirect_cache.get(scope["path"][1:]) is not None):
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.try_acquire(priority):
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+    def _observe_lifespan(self, receive):
+        """Watch query latency from application startup to shutdown only, so stopped apps leave no observer."""
+        async def lifespan_receive():
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                add_query_observer(self.limiter.observe_query)
+            elif message["type"] == "lifespan.shutdown":
+                remove_query_observer(self.limiter.observe_query)
+            return message
+        return lifespan_receive
+
+    @staticmethod
+    async def _reject(send) -> None:
+        body = json.dumps({"detail": "Service overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.LOAD_SHEDDING_RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,273 @@
+"""Opt-in profiling of individual requests.
+
+``ProfilingMiddleware`` profiles a random fraction of requests
+(``PROFILE_SAMPLE_RATE``) and requests whose ``X-Profile`` header matches
+``PROFILE_TOKEN``. Two profilers are available through ``PROFILE_MODE``:
+
+- ``sampling`` (default): a thread samples the stacks of the threads serving
+  the request every ``PROFILE_SAMPLE_INTERVAL_MS`` and writes collapsed stacks
+  (``<name>.collapsed``), ready for flamegraph.pl or speedscope. Threadpool
+  threads are attributed to the request once they run one of its queries.
+- ``cprofile``: deterministic profiling with cProfile, written as pstats
+  (``<name>.prof``). It only sees code on the event loop thread, such as the
+  async redirect endpoint, not sync endpoints running in the threadpool.
+
+Each profile gets a ``<name>.json`` file with the route, status, duration and
+query count and time. Other requests served by the same threads meanwhile
+show up in the samples too, so profiles are most precise under low load. At
+most one request is profiled at a time and only the newest
+``PROFILE_MAX_FILES`` profiles are kept. Profiling time is capped at
+``PROFILE_MAX_OVERHEAD`` of wall time: a profile stops early, marked
+``truncated``, once the budget is spent, and any overshoot is paid back
+before the next profile starts.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import anyio
+
+from core.config import settings
+from db.instrumentation import QueryStats, track_queries
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+OVERHEAD_WINDOW_SECONDS = 60.0
+# Innermost functions of a thread waiting for work, left out of the samples
+IDLE_FUNCTIONS = {"select", "poll", "wait", "_wait_for_tstate_lock"}
+
+class OverheadGuard:
+    """Keep the time spent profiling below a fraction of wall time.
+
+    A token bucket refilled with max_fraction seconds per second of wall time,
+    holding at most window_seconds worth. Costs beyond the balance leave it
+    negative, so an overshoot is paid back before profiling resumes.
+    """
+
+    def __init__(self, max_fraction: float, window_seconds: float = OVERHEAD_WINDOW_SECONDS):
+        self.max_fraction = max_fraction
+        self.capacity = max_fraction * window_seconds
+        self._balance = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Profiling time left in the budget, negative while an overshoot is paid back."""
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(self.capacity, self._balance + (now - self._updated) * self.max_fraction)
+            self._updated = now
+            return self._balance
+
+    def allow(self) -> bool:
+        """Check whether a new profile may start."""
+        return self.remaining() > 0
+
+    def record(self, seconds: float) -> None:
+        """Charge profiling cost to the budget."""
+        with self._lock:
+            self._balance -= seconds
+
+class StackSampler:
+    """Sample the stacks of the threads executing one request from a background thread."""
+
+    def __init__(self, interval_seconds: float, queries: QueryStats, guard: OverheadGuard):
+        self.interval_seconds = interval_seconds
+        self.queries = queries
+        self.guard = guard
+        self.stacks: Counter = Counter()
+        # Set when sampling stopped because the overhead budget was spent
+        self.truncated = False
+        self._request_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            for thread_id in [self._request_thread, *list(self.queries.threads)]:
+                frame = frames.get(thread_id)
+                if frame is not None and frame.f_code.co_name not in IDLE_FUNCTIONS:
+                    self.stacks[collapse_stack(frame)] += 1
+            del frames
+            # Charged as it goes, so sampling stops as soon as the budget is spent
+            self.guard.record(time.perf_counter() - started)
+            if self.guard.remaining() <= 0:
+                self.truncated = True
+                return
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed stack format, one ``frame;frame;frame count`` line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def collapse_stack(frame) -> str:
+    """Stack of a frame from the outermost call, as ``function (file:line)`` joined by semicolons."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class ProfileWriter:
+    """Write profiles to a directory, keeping only the newest ones."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def write(self, name: str, extension: str, data, metadata: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.{extension}")
+        if isinstance(data, cProfile.Profile):
+            data.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                f.write(data)
+        with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        self._rotate()
+
+    def _rotate(self) -> None:
+        names = sorted({entry.rsplit(".", 1)[0] for entry in os.listdir(self.directory)})
+        for name in names[:max(len(names) - self.max_files, 0)]:
+            for extension in ("collapsed", "prof", "json"):
+                path = os.path.join(self.directory, f"{name}.{extension}")
+                if os.path.exists(path):
+                    os.unlink(path)
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_") or "root"
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling sampled or explicitly requested HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.token = settings.PROFILE_TOKEN.encode()
+        self.mode = settings.PROFILE_MODE
+        self.interval_seconds = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        self.guard = OverheadGuard(settings.PROFILE_MAX_OVERHEAD)
+        self.writer = ProfileWriter(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+        # One profile at a time: samples of concurrent profiles would mix
+        self._active = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        if not self.token:
+            return False
+        value = dict(scope["headers"]).get(PROFILE_HEADER)
+        return value is not None and hmac.compare_digest(value, self.token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        if not (requested or random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+        if not self.guard.allow() or not self._active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send, requested)
+        finally:
+            self._active.release()
+
+    async def _profile(self, scope, receive, send, requested: bool):
+        started_at = datetime.now(timezone.utc)
+        name = f"{started_at:%Y%m%dT%H%M%S%f}-{scope['method']}-{_slug(scope['path'])}"
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if requested:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (PROFILE_ID_HEADER, name.encode())]}
+            await send(message)
+
+        profiled_seconds = None
+
+        def stop_profiler():
+            # On the event loop thread, the only one cProfile can be disabled from
+            nonlocal profiled_seconds
+            if profiled_seconds is None:
+                profiler.disable()
+                profiled_seconds = time.perf_counter() - started
+
+        with track_queries() as queries:
+            profiler = None
+            sampler = None
+            started = time.perf_counter()
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                # Deterministic profiling slows the whole request down, so it stops when the budget is spent
+                budget_timer = asyncio.get_running_loop().call_later(max(self.guard.remaining(), 0), stop_profiler)
+                profiler.enable()
+            else:
+                sampler = StackSampler(self.interval_seconds, queries, self.guard)
+                sampler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                duration = time.perf_counter() - started
+                if profiler is not None:
+                    truncated = profiled_seconds is not None
+                    budget_timer.cancel()
+                    stop_profiler()
+                else:
+                    await anyio.to_thread.run_sync(sampler.stop)
+                    truncated = sampler.truncated
+
+        route = scope.get("route")
+        metadata = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status_code": status_code,
+            "started_at": started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "query_count": queries.count,
+            "query_ms": round(queries.seconds * 1000, 3),
+            "mode": self.mode,
+            "triggered_by": "header" if requested else "sampling",
+            "truncated": truncated,
+        }
+        if sampler is not None:
+            metadata["samples"] = sum(sampler.stacks.values())
+            metadata["sample_interval_ms"] = self.interval_seconds * 1000
+            # Samples were charged while they were taken
+            data, extension, cost = sampler.collapsed(), "collapsed", 0.0
+        else:
+            data, extension, cost = profiler, "prof", profiled_seconds
+
+        write_started = time.perf_counter()
+        try:
+            await anyio.to_thread.run_sync(self.writer.write, name, extension, data, metadata)
+        except OSError:
+            logger.exception("Failed to write profile %s", name)
+        self.guard.record(cost + time.perf_counter() - write_started)
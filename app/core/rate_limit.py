@@ -0,0 +1,134 @@
+"""Per-client token bucket rate limiting.
+
+``RateLimitMiddleware`` runs before routing, so rejected requests get a 429
+without opening a database session. Redirects are limited per client IP.
+Link creation is limited per username when the credentials are already in the
+authentication cache, which costs no database query, and per client IP
+otherwise, so unverified usernames cannot drain another user's bucket.
+
+Buckets live in an LRU-ordered dict: every request moves its key to the end,
+so the least recently seen keys sit at the front and are evicted in O(1) once
+they have been idle long enough to be full again (at which point forgetting
+them changes nothing) or when the dict is over ``RATE_LIMIT_MAX_KEYS``.
+"""
+
+import base64
+import binascii
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from core.config import settings
+from core.security import auth_cache
+from services.urls import RESERVED_PATHS
+
+REDIRECT_PATH = re.compile(r"^/[^/]+$")
+CREATE_LINK_PATHS = {"/api/links", "/api/links/"}
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client, refilled at rate tokens per second up to burst.
+
+    Not thread-safe: the middleware calls it from the event loop only.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        # An untouched bucket is full again after this long
+        self.idle_seconds = self.burst / rate
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take a token for key; return 0 when allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_keys and now - updated_at < self.idle_seconds:
+                return
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+def _basic_auth_credentials(scope) -> Optional[tuple[str, str]]:
+    header = dict(scope["headers"]).get(b"authorization", b"")
+    scheme, _, encoded = header.partition(b" ")
+    if scheme.lower() != b"basic":
+        return None
+    try:
+        username, separator, password = base64.b64decode(encoded, validate=True).decode().partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return (username, password) if separator else None
+
+class RateLimitMiddleware:
+    """ASGI middleware rejecting clients over their rate with 429 and Retry-After."""
+
+    def __init__(self, app):
+        self.app = app
+        self.redirects = self._limiter(settings.REDIRECT_RATE_LIMIT_PER_SECOND, settings.REDIRECT_RATE_LIMIT_BURST)
+        self.creates = self._limiter(settings.CREATE_RATE_LIMIT_PER_SECOND, settings.CREATE_RATE_LIMIT_BURST)
+
+    @staticmethod
+    def _limiter(rate: float, burst: float) -> Optional[TokenBucketLimiter]:
+        return TokenBucketLimiter(rate, burst, settings.RATE_LIMIT_MAX_KEYS) if rate > 0 else None
+
+    def _bucket(self, scope) -> Optional[tuple[TokenBucketLimiter, str]]:
+        method, path = scope["method"], scope["path"]
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        if (method == "GET" and self.redirects is not None
+                and REDIRECT_PATH.match(path) and path not in RESERVED_PATHS):
+            return self.redirects, client_ip
+        if method == "POST" and self.creates is not None and path in CREATE_LINK_PATHS:
+            credentials = _basic_auth_credentials(scope)
+            if credentials and auth_cache.get(*credentials) is not None:
+                return self.creates, f"user:{credentials[0]}"
+            return self.creates, client_ip
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        bucket = self._bucket(scope)
+        if bucket is not None:
+            limiter, key = bucket
+            retry_after = limiter.acquire(key)
+            if retry_after > 0:
+                await self._reject(send, retry_after)
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
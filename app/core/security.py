@@ -1,16 +1,79 @@
 """Security utilities for authentication and password handling."""
 
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from core.config import settings
 from db.database import get_db
 from models.user import User
+from services.invalidation import USER_EVENT, invalidation_bus
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBasic()
 
+class AuthCache:
+    """Cache of recently verified credentials, skipping the user lookup and bcrypt on repeat requests.
+
+    The API never changes a user's password or ``is_active``, so entries only
+    expire after ``ttl_seconds``. Tools changing users in the database can
+    drop them in every worker with ``invalidation_bus.publish_user``.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # Passwords are only kept as keyed digests with a per-process key
+        self._key = os.urandom(32)
+        self._entries: "OrderedDict[str, tuple[float, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._key, password.encode(), hashlib.sha256).digest()
+    
+    def get(self, username: str, password: str) -> Optional[User]:
+        """Return a detached active user if these credentials were verified recently."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            stored_at, hashed_password, digest = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+        if not hmac.compare_digest(digest, self._digest(password)):
+            return None
+        return User(username=username, hashed_password=hashed_password, is_active=True)
+    
+    def set(self, user: User, password: str) -> None:
+        """Remember credentials that were just verified for an active user."""
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        digest = self._digest(password)
+        with self._lock:
+            self._entries[user.username] = (time.monotonic(), user.hashed_password, digest)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, username: str) -> None:
+        """Forget the credentials of a user."""
+        with self._lock:
+            self._entries.pop(username, None)
+
+auth_cache = AuthCache(max_size=settings.AUTH_CACHE_SIZE, ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS)
+invalidation_bus.subscribe(USER_EVENT, auth_cache.invalidate)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -21,6 +84,10 @@ def get_password_hash(password: str) -> str:
 
 def authenticate_user(db: Session, credentials: HTTPBasicCredentials) -> User:
     """Authenticate user with HTTP Basic credentials."""
+    cached_user = auth_cache.get(credentials.username, credentials.password)
+    if cached_user is not None:
+        return cached_user
+    
     user = db.query(User).filter(User.username == credentials.username).first()
     if not user or not verify_password(credentials.password, user.hashed_password):
         raise HTTPException(
@@ -34,6 +101,7 @@ def authenticate_user(db: Session, credentials: HTTPBasicCredentials) -> User:
             detail="Inactive user",
             headers={"WWW-Authenticate": "Basic"},
         )
+    auth_cache.set(user, credentials.password)
     return user
 
 def get_current_user(
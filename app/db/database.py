@@ -1,6 +1,10 @@
 """Database connection and session management."""
 
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
@@ -12,8 +16,18 @@ engine = create_engine(
     pool_recycle=300,    # Recycle connections every 5 minutes
 )
 
+# Read-only queries go to the replica when one is configured
+read_engine = create_engine(
+    settings.DATABASE_READ_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+) if settings.DATABASE_READ_URL else engine
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+logger = logging.getLogger(__name__)
 
 # Create Base class for models
 Base = declarative_base()
@@ -25,3 +39,93 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Dependency to get a database session for read-only queries, bound to the replica if any."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+class ReplicaLagMonitor:
+    """Measure replication lag of the read engine, caching the result for a short interval."""
+    
+    # Zero when the replica has replayed everything it received, so an idle primary reads as no lag
+    POSTGRES_LAG_QUERY = text(
+        "SELECT CASE WHEN NOT pg_is_in_recovery() "
+        "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+    
+    def __init__(self, check_interval_seconds: float):
+        self.check_interval_seconds = check_interval_seconds
+        self._lag = 0.0
+        self._checked_at = None
+        self._lock = threading.Lock()
+    
+    def lag_seconds(self) -> float:
+        """Get the replica lag in seconds, infinite if it cannot be measured."""
+        if read_engine is engine:
+            return 0.0
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval_seconds:
+            # One caller measures, the others keep using the previous value instead of waiting on the query
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._lag = self._measure()
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._lag
+    
+    def _measure(self) -> float:
+        # Other dialects, such as the SQLite files used as local stand-ins, report no lag
+        if read_engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with read_engine.connect() as connection:
+                return float(connection.execute(self.POSTGRES_LAG_QUERY).scalar())
+        except Exception as e:
+            logger.warning("Could not measure replica lag: %s", e)
+            return float("inf")
+
+replica_lag_monitor = ReplicaLagMonitor(check_interval_seconds=settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+
+def dialect_insert(db):
+    """Return the dialect specific insert() supporting ON CONFLICT, or None if unavailable."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+def check_connection() -> None:
+    """Open connections so the pools are primed and the databases are reachable."""
+    for bound_engine in {engine, read_engine}:
+        with bound_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+def create_tables() -> None:
+    """Create all tables that do not exist yet."""
+    Base.metadata.create_all(bind=engine)
+
+def verify_schema() -> None:
+    """Check that every mapped table and column exists, without altering anything."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    problems = []
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            problems.append(f"missing table '{table.name}'")
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                problems.append(f"missing column '{table.name}.{column.name}'")
+    
+    if problems:
+        raise RuntimeError(f"Database schema mismatch: {', '.join(problems)}")
@@ -0,0 +1,80 @@
+"""Per-request accounting of database queries.
+
+``track_queries()`` starts a ``QueryStats`` in the current context. Statements
+executed on an instrumented engine add to the stats of the context they run
+in, which includes the threadpool threads running a request's sync code, as
+those inherit the request's context. Observers registered with
+``add_query_observer`` see the duration of every statement.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+
+@dataclass
+class QueryStats:
+    """Queries of one request."""
+    count: int = 0
+    seconds: float = 0.0
+    # Threads that executed queries for the request
+    threads: set = field(default_factory=set)
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_observers: List[Callable[[float], None]] = []
+
+@contextmanager
+def track_queries():
+    """Count the queries executed in the current context until the block exits."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the enclosing track_queries() block, if any."""
+    return _current_stats.get()
+
+def add_query_observer(observer: Callable[[float], None]) -> None:
+    """Call observer with the duration in seconds of every statement on instrumented engines."""
+    if observer not in _observers:
+        _observers.append(observer)
+
+def remove_query_observer(observer: Callable[[float], None]) -> None:
+    """Stop calling an observer added with add_query_observer."""
+    if observer in _observers:
+        _observers.remove(observer)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.threads.add(threading.get_ident())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    for observer in _observers:
+        observer(elapsed)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started_at"):
+        connection.info["query_started_at"].pop()
+
+def instrument_engine(engine) -> None:
+    """Attach the query accounting listeners to an engine, once."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,232 @@
+"""Data migrations for databases created by earlier versions of the service.
+
+``create_all`` never alters existing tables, so schema changes to tables that
+already hold data are applied here. Every migration is idempotent and commits
+in batches, so it can be interrupted and run again.
+
+Usage (from the app directory)::
+
+    python -m db.migrations clicks-storage
+    python -m db.migrations links-soft-delete
+    python -m db.migrations clicks-partitioning
+    python -m db.migrations links-url-hash
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, inspect, text
+
+from core.config import settings
+from db.database import Base, engine
+from db.partitions import clicks_is_partitioned, ensure_click_partitions
+from db.types import IPAddress
+import models  # noqa: F401 - register every model with Base.metadata
+from models.click import Click
+from models.link import Link
+from models.user_agent import UserAgent
+from services.urls import url_hash
+from services.user_agents import MAX_USER_AGENT_LENGTH, hash_user_agent
+
+logger = logging.getLogger(__name__)
+
+def _column_names(table_name: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table_name)}
+
+def migrate_clicks_storage(batch_size: int = 5000) -> int:
+    """Move clicks from inline user agent and IP strings to user_agents ids and binary IPs.
+
+    Returns the number of click rows converted.
+    """
+    columns = _column_names("clicks")
+    if "user_agent" not in columns and "ip_address" not in columns:
+        logger.info("clicks table already uses the compact storage")
+        return 0
+
+    Base.metadata.create_all(bind=engine, tables=[UserAgent.__table__])
+    with engine.begin() as connection:
+        if "ip" not in columns:
+            ip_type = IPAddress().dialect_impl(engine.dialect).compile(dialect=engine.dialect)
+            connection.execute(text(f"ALTER TABLE clicks ADD COLUMN ip {ip_type}"))
+        if "user_agent_id" not in columns:
+            connection.execute(text(
+                "ALTER TABLE clicks ADD COLUMN user_agent_id INTEGER REFERENCES user_agents(id)"
+            ))
+
+    user_agent_ids = {}
+    converted = 0
+    last_id = 0
+    ip_column = "ip_address" if "ip_address" in columns else "NULL"
+    user_agent_column = "user_agent" if "user_agent" in columns else "NULL"
+    update = Click.__table__.update().where(Click.id == bindparam("click_id")).values(
+        ip=bindparam("new_ip"), user_agent_id=bindparam("new_user_agent_id")
+    )
+
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                f"SELECT id, {ip_column}, {user_agent_column} FROM clicks "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+
+            params = []
+            for click_id, ip_address, user_agent in rows:
+                user_agent_id = None
+                if user_agent:
+                    value = user_agent[:MAX_USER_AGENT_LENGTH]
+                    user_agent_id = user_agent_ids.get(value)
+                    if user_agent_id is None:
+                        user_agent_id = _get_or_create_user_agent(connection, value)
+                        user_agent_ids[value] = user_agent_id
+                params.append({"click_id": click_id, "new_ip": ip_address,
+                               "new_user_agent_id": user_agent_id})
+
+            connection.execute(update, params)
+            last_id = rows[-1][0]
+            converted += len(rows)
+            logger.info("Converted %d clicks (up to id %d)", converted, last_id)
+
+    with engine.begin() as connection:
+        for column in ("ip_address", "user_agent"):
+            if column in columns:
+                connection.execute(text(f"ALTER TABLE clicks DROP COLUMN {column}"))
+
+    return converted
+
+def _get_or_create_user_agent(connection, value: str) -> int:
+    ua_hash = hash_user_agent(value)
+    table = UserAgent.__table__
+    lookup = table.select().with_only_columns(table.c.id).where(table.c.ua_hash == ua_hash)
+    user_agent_id = connection.execute(lookup).scalar()
+    if user_agent_id is None:
+        user_agent_id = connection.execute(
+            table.insert().values(ua_hash=ua_hash, value=value).returning(table.c.id)
+        ).scalar()
+    return user_agent_id
+
+def migrate_links_soft_delete(batch_size: int = 5000) -> int:
+    """Add the deleted_at column used to hide deleted links until they are purged.
+
+    Returns the number of columns added.
+    """
+    if "deleted_at" in _column_names("links"):
+        logger.info("links table already has deleted_at")
+        return 0
+
+    column_type = Link.__table__.c.deleted_at.type.compile(dialect=engine.dialect)
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE links ADD COLUMN deleted_at {column_type}"))
+        connection.execute(text("CREATE INDEX ix_links_deleted_at ON links (deleted_at)"))
+    return 1
+
+def migrate_clicks_partitioning(batch_size: int = 50000) -> int:
+    """Turn clicks into a Postgres table partitioned by day on clicked_at.
+
+    The table is renamed and replaced in one transaction, so new clicks go to
+    the partitioned table at once; existing rows are then copied in batches.
+    An interrupted run leaves clicks_unpartitioned behind, and running again
+    copies its remaining rows and finishes. Returns the number of click rows
+    copied.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Click partitioning requires Postgres")
+
+    with engine.begin() as connection:
+        partitioned = clicks_is_partitioned(connection)
+        if partitioned and "clicks_unpartitioned" not in inspect(connection).get_table_names():
+            logger.info("clicks table is already partitioned")
+            return 0
+        if not partitioned:
+            connection.execute(text("ALTER TABLE clicks RENAME TO clicks_unpartitioned"))
+            connection.execute(text("ALTER INDEX clicks_pkey RENAME TO clicks_unpartitioned_pkey"))
+            # Keep the id sequence when the old table is dropped
+            connection.execute(text("ALTER SEQUENCE clicks_id_seq OWNED BY NONE"))
+            connection.execute(text(
+                "CREATE TABLE clicks (LIKE clicks_unpartitioned INCLUDING DEFAULTS, "
+                "PRIMARY KEY (id, clicked_at), "
+                "FOREIGN KEY (link_id) REFERENCES links (id) ON DELETE CASCADE, "
+                "FOREIGN KEY (user_agent_id) REFERENCES user_agents (id)) "
+                "PARTITION BY RANGE (clicked_at)"
+            ))
+            connection.execute(text("CREATE TABLE clicks_default PARTITION OF clicks DEFAULT"))
+        first_clicked_at = connection.execute(text("SELECT min(clicked_at) FROM clicks_unpartitioned")).scalar()
+        ensure_click_partitions(connection, (first_clicked_at or datetime.now(timezone.utc)).date(),
+                                settings.CLICK_PARTITION_DAYS_AHEAD)
+
+    copied = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                "WITH batch AS (DELETE FROM clicks_unpartitioned WHERE id IN "
+                "(SELECT id FROM clicks_unpartitioned WHERE id > :last_id ORDER BY id LIMIT :limit) "
+                "RETURNING *) "
+                "INSERT INTO clicks SELECT * FROM batch RETURNING id"
+            ), {"last_id": last_id, "limit": batch_size}).scalars().all()
+        if not rows:
+            break
+        copied += len(rows)
+        last_id = max(rows)
+        logger.info("Copied %d clicks into the partitioned table (up to id %d)", copied, last_id)
+
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE clicks_unpartitioned"))
+        connection.execute(text("ALTER SEQUENCE clicks_id_seq OWNED BY clicks.id"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_clicks_link_id ON clicks (link_id)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_clicks_clicked_at ON clicks (clicked_at)"))
+    return copied
+
+def migrate_links_url_hash(batch_size: int = 5000) -> int:
+    """Add links.url_hash with its per-user index and fill it for existing links.
+
+    Returns the number of links hashed.
+    """
+    if "url_hash" not in _column_names("links"):
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE links ADD COLUMN url_hash VARCHAR(64)"))
+    index_names = {index["name"] for index in inspect(engine).get_indexes("links")}
+    if "ix_links_created_by_url_hash" not in index_names:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_links_created_by_url_hash ON links (created_by, url_hash)"))
+
+    update = Link.__table__.update().where(Link.id == bindparam("link_id")).values(url_hash=bindparam("new_url_hash"))
+    hashed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                "SELECT id, original_url FROM links "
+                "WHERE id > :last_id AND url_hash IS NULL ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+            connection.execute(update, [
+                {"link_id": link_id, "new_url_hash": url_hash(original_url)} for link_id, original_url in rows
+            ])
+        last_id = rows[-1][0]
+        hashed += len(rows)
+        logger.info("Hashed %d links (up to id %d)", hashed, last_id)
+    return hashed
+
+MIGRATIONS = {
+    "clicks-storage": migrate_clicks_storage,
+    "links-soft-delete": migrate_links_soft_delete,
+    "clicks-partitioning": migrate_clicks_partitioning,
+    "links-url-hash": migrate_links_url_hash,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply data migrations to an existing database.")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    count = MIGRATIONS[args.migration](batch_size=args.batch_size)
+    print(f"Migration '{args.migration}' done: {count} rows converted")
+
+if __name__ == "__main__":
+    main()
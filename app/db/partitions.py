@@ -0,0 +1,70 @@
+"""Daily range partitions of the clicks table on Postgres.
+
+When ``clicks`` is partitioned by ``clicked_at`` (see the ``clicks-partitioning``
+migration), retention drops whole partitions instead of deleting rows. Each
+partition covers one UTC day and is named ``clicks_pYYYYMMDD``.
+"""
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+PARTITION_NAME = re.compile(r"^clicks_p(\d{8})$")
+
+def partition_name(day: date) -> str:
+    """Name of the partition holding the clicks of a day."""
+    return f"clicks_p{day:%Y%m%d}"
+
+def clicks_is_partitioned(connection) -> bool:
+    """Check whether the clicks table is a partitioned table."""
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'clicks' AND pg_table_is_visible(c.oid)"
+    )).scalar())
+
+def list_click_partitions(connection) -> List[Tuple[str, date]]:
+    """Daily partitions of clicks as (name, day), oldest first."""
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'clicks'"
+    )).scalars().all()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, datetime.strptime(match.group(1), "%Y%m%d").date()))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def create_click_partition(connection, day: date) -> None:
+    """Create the partition of a day if it does not exist yet."""
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF clicks "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    ))
+
+def ensure_click_partitions(connection, first_day: date, days_ahead: int) -> None:
+    """Create the partitions from first_day up to days_ahead days after today."""
+    last_day = datetime.now(timezone.utc).date() + timedelta(days=days_ahead)
+    day = first_day
+    while day <= last_day:
+        create_click_partition(connection, day)
+        day += timedelta(days=1)
+
+def compact_and_drop_partition(connection, name: str) -> int:
+    """Fold a whole partition into daily aggregates and drop it, returning the clicks folded."""
+    folded = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    connection.execute(text(
+        "INSERT INTO click_daily_aggregates (link_id, day, clicks, last_clicked_at) "
+        f"SELECT link_id, date_trunc('day', clicked_at), count(*), max(clicked_at) FROM {name} "
+        "GROUP BY link_id, date_trunc('day', clicked_at) "
+        "ON CONFLICT (link_id, day) DO UPDATE SET "
+        "clicks = click_daily_aggregates.clicks + EXCLUDED.clicks, "
+        "last_clicked_at = GREATEST(click_daily_aggregates.last_clicked_at, EXCLUDED.last_clicked_at)"
+    ))
+    connection.execute(text(f"DROP TABLE {name}"))
+    return folded
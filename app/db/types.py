@@ -0,0 +1,39 @@
+"""Custom column types."""
+
+import ipaddress
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.types import TypeDecorator
+
+class IPAddress(TypeDecorator):
+    """IPv4/IPv6 address stored as INET on Postgres and as 4 or 16 packed bytes elsewhere.
+
+    Values that are not valid IP addresses are stored as NULL.
+    """
+    
+    impl = LargeBinary(16)
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(INET())
+        return dialect.type_descriptor(LargeBinary(16))
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        if dialect.name == "postgresql":
+            return str(address)
+        return address.packed
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, memoryview)):
+            return str(ipaddress.ip_address(bytes(value)))
+        return str(value)
@@ -0,0 +1,56 @@
+"""Export clicks to Parquet files and query the exported data.
+
+Usage:
+    python export_clicks.py export [--dir DIR]
+    python export_clicks.py links [--dir DIR] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python export_clicks.py days [--dir DIR] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--short-url CODE]
+"""
+
+import argparse
+import json
+import logging
+import time
+from datetime import date
+
+from core.config import settings
+
+def run_export(directory):
+    # Imported here so that queries on exported files do not need a database
+    import models  # noqa: F401 - register every model
+    from services.click_export import ClickExporter, export_new_clicks
+
+    started = time.perf_counter()
+    count = export_new_clicks(directory)
+    elapsed = time.perf_counter() - started
+    watermark = ClickExporter(directory).read_watermark()
+    print(f"Exported {count} clicks in {elapsed:.2f}s, watermark at click id {watermark}")
+
+def run_query(directory, query, start, end, short_url):
+    from services.click_archive import ClickArchive
+
+    archive = ClickArchive(directory)
+    if query == "links":
+        rows = archive.clicks_by_link(start, end)
+    else:
+        rows = archive.clicks_by_day(start, end, short_url)
+    for row in rows:
+        print(json.dumps(row, default=str))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export clicks for offline analytics.")
+    parser.add_argument("command", choices=["export", "links", "days"])
+    parser.add_argument("--dir", default=settings.CLICK_EXPORT_DIR or "exports/clicks",
+                        help="Export directory")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to include")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to include")
+    parser.add_argument("--short-url", help="Restrict daily counts to one link")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "export":
+        run_export(args.dir)
+    else:
+        run_query(args.dir, args.command, args.start, args.end, args.short_url)
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,125 @@
 """Main FastAPI application."""
 
-from fastapi import FastAPI, HTTPException, status, Depends, Request
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, status, Depends, Request
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 import uvicorn
 
 from core.config import settings
-from db.database import get_db, engine, Base
+from core.load_shedding import LoadSheddingMiddleware
+from core.profiling import ProfilingMiddleware
+from core.rate_limit import RateLimitMiddleware
+from api.deps import get_redirect_db
+from db.database import ReadSessionLocal, engine, get_db, read_engine, check_connection, create_tables, verify_schema
+from db.instrumentation import instrument_engine
 from api.config import api_router
+from services.background import PeriodicTask
+from services.click_counter import fold_pending_clicks
+from services.click_retention import compact_old_clicks
+from services.idempotency import delete_expired_idempotency_keys
+from services.invalidation import invalidation_bus
+from services.leaderboard import refresh_leaderboard
+from services.link_purger import purge_deleted_links
 from services.link_service import LinkService
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Create FastAPI application
-app = FastAPI(title=settings.PROJECT_NAME,
-              description=settings.DESCRIPTION,
-              version=settings.VERSION)
-
-# Include API router
-app.include_router(api_router, prefix="/api")
-
-
-@app.get("/")
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _prepare_schema() -> None:
+    """Create or verify the schema according to DB_SCHEMA_MODE."""
+    if settings.DB_SCHEMA_MODE == "create":
+        create_tables()
+    elif settings.DB_SCHEMA_MODE == "verify":
+        verify_schema()
+    elif settings.DB_SCHEMA_MODE != "skip":
+        raise RuntimeError(f"Unknown DB_SCHEMA_MODE '{settings.DB_SCHEMA_MODE}'")
+
+
+def _warm_redirect_cache() -> int:
+    """Preload popular and recent links into the redirect cache."""
+    db = ReadSessionLocal()
+    try:
+        return LinkService.warm_redirect_cache(db,
+                                               top_n=settings.CACHE_WARMUP_TOP_N,
+                                               recent_n=settings.CACHE_WARMUP_RECENT_N)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the database and warm caches before serving requests."""
+    timings = {}
+
+    def run_phase(name, func):
+        started = time.perf_counter()
+        result = func()
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info("Startup phase '%s' finished in %.2f ms", name, timings[name])
+        return result
+
+    run_phase("engine", check_connection)
+    run_phase("schema", _prepare_schema)
+    # Listen before warming so that changes made meanwhile are not missed
+    run_phase("invalidation_bus", invalidation_bus.start)
+    cached = run_phase("cache_warmup", _warm_redirect_cache)
+    logger.info("Redirect cache warmed with %d links", cached)
+
+    background_tasks = [
+        PeriodicTask("fold_clicks", fold_pending_clicks, settings.CLICK_FOLD_INTERVAL_SECONDS),
+        PeriodicTask("purge_links", purge_deleted_links, settings.LINK_PURGE_INTERVAL_SECONDS),
+        PeriodicTask("compact_clicks", compact_old_clicks, settings.CLICK_RETENTION_INTERVAL_SECONDS),
+        PeriodicTask("expire_idempotency_keys", delete_expired_idempotency_keys,
+                     settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS),
+        PeriodicTask("refresh_leaderboard", refresh_leaderboard, settings.LEADERBOARD_REFRESH_INTERVAL_SECONDS),
+    ]
+    if settings.CLICK_EXPORT_DIR:
+        # Imported only when enabled, exports need pyarrow
+        from services.click_export import export_new_clicks
+        background_tasks.append(
+            PeriodicTask("export_clicks", export_new_clicks, settings.CLICK_EXPORT_INTERVAL_SECONDS)
+        )
+    for task in background_tasks:
+        task.start()
+
+    app.state.startup_timings = timings
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            await task.stop()
+        invalidation_bus.stop()
+
+
+def create_app() -> FastAPI:
+    """Create and configure the FastAPI application."""
+    app = FastAPI(title=settings.PROJECT_NAME,
+                  description=settings.DESCRIPTION,
+                  version=settings.VERSION,
+                  lifespan=lifespan)
+
+    # Include API router before the catch-all redirect route
+    app.include_router(api_router, prefix="/api")
+    app.include_router(router)
+
+    instrument_engine(engine)
+    instrument_engine(read_engine)
+    if settings.PROFILE_SAMPLE_RATE > 0 or settings.PROFILE_TOKEN:
+        app.add_middleware(ProfilingMiddleware)
+    if settings.LOAD_SHEDDING_ENABLED:
+        app.add_middleware(LoadSheddingMiddleware)
+    # Added last to run first: rejected requests skip everything else
+    app.add_middleware(RateLimitMiddleware)
+    return app
+
+
+@router.get("/")
 async def root():
     """Root endpoint with API information."""
     return {
@@ -32,17 +129,22 @@ async def root():
     }
 
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "service": "url-alias-service"}
 
 
-@app.get("/{short_url}")
-async def redirect_url(short_url: str, request: Request, db: Session = Depends(get_db)):
+@router.get("/{short_url}")
+async def redirect_url(short_url: str, request: Request,
+                       db: Session = Depends(get_db),
+                       read_db: Session = Depends(get_redirect_db)):
     """Public endpoint for redirecting shortened URLs."""
     # Get accessible link (active and not expired)
-    link = LinkService.get_accessible_link(db, short_url)
+    link = LinkService.resolve_redirect(read_db, short_url)
+    if not link and read_db is not db:
+        # The link may be too new to have reached the replica
+        link = LinkService.resolve_redirect(db, short_url)
 
     if not link:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
@@ -59,6 +161,9 @@ async def redirect_url(short_url: str, request: Request, db: Session = Depends(g
                             status_code=status.HTTP_301_MOVED_PERMANENTLY)
 
 
+app = create_app()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app",
                 host=settings.HOST,
@@ -2,5 +2,10 @@
 
 from .user import User
 from .link import Link
+from .click import Click
+from .click_counter import LinkClickShard
+from .user_agent import UserAgent
+from .click_aggregate import ClickDailyAggregate
+from .idempotency_key import IdempotencyKey
 
-__all__ = ["User", "Link", "Click"]
+__all__ = ["User", "Link", "Click", "LinkClickShard", "UserAgent", "ClickDailyAggregate", "IdempotencyKey"]
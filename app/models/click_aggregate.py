@@ -0,0 +1,17 @@
+"""Daily click aggregate model for compacted click history."""
+
+from sqlalchemy import Column, DateTime, Integer, ForeignKey
+from db.database import Base
+
+class ClickDailyAggregate(Base):
+    """Clicks of a link on one UTC day, kept after the raw clicks were compacted."""
+    
+    __tablename__ = "click_daily_aggregates"
+    
+    link_id = Column(Integer, ForeignKey("links.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(DateTime, primary_key=True, index=True)  # Midnight UTC of the day
+    clicks = Column(Integer, default=0, nullable=False)
+    last_clicked_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<ClickDailyAggregate(link_id={self.link_id}, day='{self.day}', clicks={self.clicks})>"
@@ -0,0 +1,16 @@
+"""Sharded click counter model."""
+
+from sqlalchemy import Column, Integer, ForeignKey
+from db.database import Base
+
+class LinkClickShard(Base):
+    """Pending clicks of a link, spread over several rows to avoid contention on one row."""
+    
+    __tablename__ = "link_click_shards"
+    
+    link_id = Column(Integer, ForeignKey("links.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<LinkClickShard(link_id={self.link_id}, shard={self.shard}, count={self.count})>"
@@ -0,0 +1,21 @@
+"""Idempotency key model for safely retried requests."""
+
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from datetime import datetime, timezone
+from db.database import Base
+
+class IdempotencyKey(Base):
+    """Response of a request sent with an Idempotency-Key header, replayed on retries."""
+    
+    __tablename__ = "idempotency_keys"
+    
+    username = Column(String(50), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # SHA-256 of the request body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is in progress
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(username='{self.username}', key='{self.key}', status_code={self.status_code})>"
@@ -1,6 +1,6 @@
 """Link model for URL shortening."""
 
-from sqlalchemy import Column, String, Boolean, DateTime, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta, timezone
 from db.database import Base
@@ -10,10 +10,15 @@ class Link(Base):
     """Link model for storing shortened URLs."""
     
     __tablename__ = "links"
+    __table_args__ = (
+        # Finds a user's existing links to the same destination
+        Index("ix_links_created_by_url_hash", "created_by", "url_hash"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     short_url = Column(String(100), unique=True, index=True, nullable=False)
     original_url = Column(String(2000), nullable=False)  # Increased length for long URLs
+    url_hash = Column(String(64), nullable=True)  # SHA-256 of the normalized original URL
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), nullable=False)
     expires_at = Column(
@@ -23,8 +28,9 @@ class Link(Base):
     )
     click_count = Column(Integer, default=0, nullable=False)
     created_by = Column(String(50), nullable=True)  # Username who created the link
-    # Relationship to Click
-    clicks = relationship("Click", back_populates="link", cascade="all, delete-orphan")
+    deleted_at = Column(DateTime, nullable=True, index=True)  # Set on delete, the row is purged later
+    # Relationship to Click, rows are removed by the purger or by the database
+    clicks = relationship("Click", back_populates="link", passive_deletes=True)
     
     def __repr__(self):
         return f"<Link(short_url='{self.short_url}', original_url='{self.original_url}', clicks={self.click_count})>"
@@ -0,0 +1,16 @@
+"""User agent dimension model."""
+
+from sqlalchemy import Column, String, Integer
+from db.database import Base
+
+class UserAgent(Base):
+    """Distinct user agent strings, referenced from clicks by id."""
+    
+    __tablename__ = "user_agents"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ua_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256 of the value
+    value = Column(String(500), nullable=False)
+    
+    def __repr__(self):
+        return f"<UserAgent(id={self.id}, value='{self.value}')>"
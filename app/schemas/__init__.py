@@ -1,7 +1,16 @@
 """Pydantic schemas for request/response validation."""
 
 from .user import UserCreate, UserResponse
-from .link import LinkCreate, LinkResponse, LinkUpdate, PaginatedLinksResponse, LinkStats
+from .link import (
+    LinkCreate,
+    LinkResponse,
+    LinkUpdate,
+    LinkBulkFilter,
+    LinkBulkUpdate,
+    LinkBulkUpdateResponse,
+    PaginatedLinksResponse,
+    LinkStats,
+)
 
 __all__ = [
     "UserCreate", 
@@ -9,6 +18,9 @@ __all__ = [
     "LinkCreate", 
     "LinkResponse", 
     "LinkUpdate", 
+    "LinkBulkFilter",
+    "LinkBulkUpdate",
+    "LinkBulkUpdateResponse",
     "PaginatedLinksResponse",
     "LinkStats"
 ]
@@ -1,8 +1,10 @@
 """Link schemas for request/response validation."""
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
+
+from services.urls import validate_original_url
 
 class LinkBase(BaseModel):
     """Base link schema."""
@@ -11,27 +13,51 @@ class LinkBase(BaseModel):
 class LinkCreate(LinkBase):
     """Schema for creating a link."""
     expires_in_days: Optional[int] = 1
+    # Return the user's existing active link to the same URL instead of creating one
+    reuse_existing: bool = False
     
     @field_validator('original_url')
     def validate_url(cls, v):
         """Validate URL format."""
-        from urllib.parse import urlparse
-        
-        if not v.startswith(('http://', 'https://')):
-            raise ValueError('URL must start with http:// or https://')
-        
-        # Validate URL structure
-        parsed = urlparse(v)
-        if not parsed.netloc or '.' not in parsed.netloc:
-            raise ValueError('URL must contain a valid domain')
-        
-        return v
+        return validate_original_url(v)
 
 class LinkUpdate(BaseModel):
     """Schema for updating a link."""
     is_active: Optional[bool] = None
     expires_in_days: Optional[int] = None
 
+class LinkBulkFilter(BaseModel):
+    """Filter selecting the links of a bulk update, conditions are combined with AND."""
+    created_before: Optional[datetime] = None
+    expired: Optional[bool] = None
+    url_prefix: Optional[str] = Field(None, min_length=1)
+    
+    @model_validator(mode='after')
+    def validate_conditions(self):
+        """Require at least one condition, an empty filter would select every link."""
+        if self.created_before is None and self.expired is None and self.url_prefix is None:
+            raise ValueError('Provide created_before, expired or url_prefix')
+        return self
+
+class LinkBulkUpdate(LinkUpdate):
+    """Schema for updating many links at once, selected by short URLs or by a filter."""
+    short_urls: Optional[List[str]] = Field(None, min_length=1, max_length=10000)
+    filter: Optional[LinkBulkFilter] = None
+    
+    @model_validator(mode='after')
+    def validate_selection(self):
+        """Require exactly one selection and at least one change."""
+        if (self.short_urls is None) == (self.filter is None):
+            raise ValueError('Provide either short_urls or filter')
+        if self.is_active is None and self.expires_in_days is None:
+            raise ValueError('Provide is_active or expires_in_days')
+        return self
+
+class LinkBulkUpdateResponse(BaseModel):
+    """Schema for bulk update result."""
+    updated: int
+    not_found: List[str] = []
+
 class LinkResponse(LinkBase):
     """Schema for link response."""
     id: int
@@ -74,6 +100,9 @@ class LinkStats(BaseModel):
     last_day_clicks: int = 0
     last_week_clicks: int = 0
     last_month_clicks: int = 0
+    windows: Dict[str, int] = Field(default_factory=dict)
+    # Time up to which clicks are counted, earlier than now when served from the leaderboard snapshot
+    as_of: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,40 @@
+"""Periodic background jobs run alongside the application."""
+
+import asyncio
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """Run a blocking function in a worker thread at a fixed interval."""
+
+    def __init__(self, name: str, func: Callable[[], object], interval_seconds: float):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await asyncio.to_thread(self.func)
+            except Exception:
+                logger.exception("Background task '%s' failed", self.name)
+
+    def start(self) -> None:
+        """Schedule the task on the running event loop, disabled for non-positive intervals."""
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        """Cancel the task and wait for it to finish."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
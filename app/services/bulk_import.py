@@ -0,0 +1,424 @@
+"""Streaming bulk import of users and links from CSV or JSONL files.
+
+Records are read one line at a time and loaded in batches of ``batch_size``,
+so memory stays bounded whatever the input size. Each batch is one
+transaction: on PostgreSQL with psycopg2 the rows are copied with ``COPY``
+into a temporary table and inserted from there, elsewhere they are inserted
+with executemany. Both skip rows whose key already exists.
+
+After every batch the byte offset of the next record is written to the
+checkpoint file, so an interrupted import resumes where it stopped. Invalid
+records are appended to the rejects file as JSON lines with their offset and
+error instead of stopping the import. A batch the database refuses, with a
+data or integrity error, is loaded again row by row and the refused rows are
+rejected the same way.
+
+Given short codes are kept. Missing ones are derived from the input file name
+and the record offset, so importing the same file again, with or without its
+checkpoint, finds the links it already created instead of duplicating them.
+A code already taken by a link to a different URL or owner is rejected when
+it was given and derived again otherwise. Codes derived for earlier records
+may take a code given further down the file, which is then rejected.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import string
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.security import get_password_hash
+from db.database import dialect_insert
+from models.link import Link
+from models.user import User
+from services.cache import utc_naive
+from services.urls import RESERVED_PATHS, url_hash, validate_original_url
+
+logger = logging.getLogger(__name__)
+
+INPUT_FORMATS = ("csv", "jsonl")
+SHORT_URL_ALPHABET = string.ascii_letters + string.digits
+SHORT_URL_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,100}$")
+# Derived codes are tried this many times before a record is rejected
+MAX_ALLOCATION_ATTEMPTS = 5
+# Largest value of the 32-bit click_count column
+MAX_CLICK_COUNT = 2**31 - 1
+
+@dataclass
+class ImportProgress:
+    """Position and counters of an import, saved as its checkpoint."""
+    input: str
+    kind: str
+    offset: int = 0
+    rows: int = 0
+    inserted: int = 0
+    existing: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+@dataclass
+class PreparedRow:
+    """A validated record ready to be inserted."""
+    offset: int
+    values: dict
+    record: dict
+    # Code derived rather than given, derived again on conflicts
+    allocated: bool = False
+    attempt: int = 0
+
+@dataclass
+class BatchResult:
+    inserted: int = 0
+    existing: int = 0
+    rejects: List[dict] = field(default_factory=list)
+
+def read_records(path: str, input_format: str, offset: int = 0) -> Iterator[Tuple[int, int, Optional[dict], Optional[str]]]:
+    """Yield ``(offset, next_offset, record, error)`` for each non-empty line from a byte offset.
+
+    CSV files need a header line and one record per line. A line that cannot
+    be parsed is yielded with its error and no record.
+    """
+    with open(path, "rb") as f:
+        header = None
+        if input_format == "csv":
+            header = next(csv.reader([f.readline().decode("utf-8-sig")]), None)
+            if not header:
+                raise ValueError(f"{path} has no CSV header")
+            header = [name.strip() for name in header]
+        if offset > f.tell():
+            f.seek(offset)
+        while True:
+            start = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            try:
+                line = line.decode("utf-8").strip()
+                if not line:
+                    continue
+                if header is None:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("expected a JSON object")
+                else:
+                    values = next(csv.reader([line]))
+                    if len(values) != len(header):
+                        raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+                    record = dict(zip(header, values))
+            except (ValueError, csv.Error) as e:
+                yield start, f.tell(), None, str(e)
+                continue
+            yield start, f.tell(), record, None
+
+def allocate_short_url(seed: str, attempt: int, length: int) -> str:
+    """Derive a short code from a seed, a different one for every attempt."""
+    number = int.from_bytes(hashlib.sha256(f"{seed}:{attempt}".encode()).digest(), "big")
+    chars = []
+    for _ in range(length):
+        number, index = divmod(number, len(SHORT_URL_ALPHABET))
+        chars.append(SHORT_URL_ALPHABET[index])
+    return "".join(chars)
+
+def _field(record: dict, name: str) -> Optional[str]:
+    value = record.get(name)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _parse_bool(value, default: bool) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().lower()
+    if normalized in ("true", "t", "yes", "1"):
+        return True
+    if normalized in ("false", "f", "no", "0"):
+        return False
+    raise ValueError(f"invalid boolean '{value}'")
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    try:
+        return utc_naive(datetime.fromisoformat(value))
+    except ValueError:
+        raise ValueError(f"invalid datetime '{value}'")
+
+class BulkImporter:
+    """Import users or links from one input file."""
+
+    def __init__(self, kind: str, batch_size: int = 10000, expires_in_days: Optional[int] = None,
+                 short_url_length: Optional[int] = None):
+        if kind not in ("users", "links"):
+            raise ValueError(f"Unknown import kind '{kind}'")
+        self.kind = kind
+        self.model = User if kind == "users" else Link
+        self.key = "username" if kind == "users" else "short_url"
+        self.batch_size = batch_size
+        self.expires_in_days = expires_in_days or settings.DEFAULT_LINK_EXPIRY_DAYS
+        self.short_url_length = short_url_length or settings.SHORT_URL_LENGTH
+
+    def prepare(self, seed: str, offset: int, record: dict, now: datetime) -> PreparedRow:
+        """Validate a record and build its column values, raising ValueError for invalid ones."""
+        if self.kind == "users":
+            return self._prepare_user(offset, record)
+        return self._prepare_link(f"{seed}:{offset}", offset, record, now)
+
+    @staticmethod
+    def _prepare_user(offset: int, record: dict) -> PreparedRow:
+        username = _field(record, "username")
+        if not username or len(username) > 50:
+            raise ValueError("username must be 1 to 50 characters")
+        hashed_password = _field(record, "hashed_password")
+        if hashed_password is None:
+            password = _field(record, "password")
+            if password is None:
+                raise ValueError("hashed_password or password is required")
+            # Costly by design, prefer exporting the existing hashes
+            hashed_password = get_password_hash(password)
+        elif not hashed_password.startswith("$2"):
+            raise ValueError("hashed_password must be a bcrypt hash")
+        elif len(hashed_password) > 200:
+            raise ValueError("hashed_password is longer than 200 characters")
+        return PreparedRow(offset, {
+            "username": username,
+            "hashed_password": hashed_password,
+            "is_active": _parse_bool(record.get("is_active"), True),
+        }, record)
+
+    def _prepare_link(self, seed: str, offset: int, record: dict, now: datetime) -> PreparedRow:
+        original_url = _field(record, "original_url")
+        if original_url is None:
+            raise ValueError("original_url is required")
+        validate_original_url(original_url)
+        if len(original_url) > 2000:
+            raise ValueError("original_url is longer than 2000 characters")
+
+        short_url = _field(record, "short_url")
+        allocated = short_url is None
+        if allocated:
+            short_url = allocate_short_url(seed, 0, self.short_url_length)
+        elif not SHORT_URL_PATTERN.match(short_url) or f"/{short_url}" in RESERVED_PATHS or short_url == "api":
+            raise ValueError(f"invalid short_url '{short_url}'")
+
+        created_at = _parse_datetime(_field(record, "created_at")) or now
+        expires_at = _parse_datetime(_field(record, "expires_at")) or now + timedelta(days=self.expires_in_days)
+        click_count = int(_field(record, "click_count") or 0)
+        if not 0 <= click_count <= MAX_CLICK_COUNT:
+            raise ValueError(f"click_count must be between 0 and {MAX_CLICK_COUNT}")
+        created_by = _field(record, "created_by")
+        if created_by is not None and len(created_by) > 50:
+            raise ValueError("created_by is longer than 50 characters")
+        return PreparedRow(offset, {
+            "short_url": short_url,
+            "original_url": original_url,
+            "url_hash": url_hash(original_url),
+            "is_active": _parse_bool(record.get("is_active"), True),
+            "created_at": created_at,
+            "expires_at": expires_at,
+            "click_count": click_count,
+            "created_by": created_by,
+        }, record, allocated=allocated)
+
+    def load_batch(self, db: Session, rows: List[PreparedRow], seed: str) -> BatchResult:
+        """Insert a batch, resolving key conflicts, without committing."""
+        result = BatchResult()
+        while rows:
+            # One row per key, later duplicates are resolved as conflicts in the next round
+            unique = {}
+            for row in rows:
+                unique.setdefault(row.values[self.key], row)
+            inserted = self._insert(db, [row.values for row in unique.values()])
+            result.inserted += len(inserted)
+            conflicts = [row for row in rows if row.values[self.key] not in inserted or unique[row.values[self.key]] is not row]
+            rows = self._resolve_conflicts(db, conflicts, seed, result)
+        return result
+
+    def load_each(self, db: Session, rows: List[PreparedRow], seed: str) -> BatchResult:
+        """Insert rows one transaction each, rejecting the rows the database refuses."""
+        result = BatchResult()
+        for row in rows:
+            try:
+                row_result = self.load_batch(db, [row], seed)
+                db.commit()
+            except (DataError, IntegrityError) as e:
+                db.rollback()
+                result.rejects.append({"offset": row.offset, "error": f"database error: {e.orig}",
+                                       "record": row.record})
+                continue
+            result.inserted += row_result.inserted
+            result.existing += row_result.existing
+            result.rejects.extend(row_result.rejects)
+        return result
+
+    def _resolve_conflicts(self, db: Session, conflicts: List[PreparedRow], seed: str, result: BatchResult) -> List[PreparedRow]:
+        if not conflicts:
+            return []
+        key_column = getattr(self.model, self.key)
+        if self.kind == "users":
+            result.existing += len(conflicts)
+            return []
+
+        keys = {row.values["short_url"] for row in conflicts}
+        owners = {
+            short_url: (original_url, created_by)
+            for short_url, original_url, created_by in db.execute(
+                select(key_column, Link.original_url, Link.created_by).where(key_column.in_(keys))
+            )
+        }
+        retry = []
+        for row in conflicts:
+            values = row.values
+            if owners.get(values["short_url"]) == (values["original_url"], values["created_by"]):
+                # Imported before, or given twice for the same link
+                result.existing += 1
+            elif row.allocated and row.attempt + 1 < MAX_ALLOCATION_ATTEMPTS:
+                row.attempt += 1
+                values["short_url"] = allocate_short_url(f"{seed}:{row.offset}", row.attempt, self.short_url_length)
+                retry.append(row)
+            else:
+                result.rejects.append({"offset": row.offset, "error": f"short_url '{values['short_url']}' is taken",
+                                       "record": row.record})
+        return retry
+
+    def _insert(self, db: Session, values: List[dict]) -> set:
+        """Insert rows whose key does not exist yet and return the keys inserted."""
+        bind = db.get_bind()
+        if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+            return self._copy(db, values)
+        insert = dialect_insert(db)
+        if insert is None:
+            raise RuntimeError(f"Bulk import does not support the {bind.dialect.name} dialect")
+        table = self.model.__table__
+        statement = insert(table).on_conflict_do_nothing(index_elements=[self.key]).returning(table.c[self.key])
+        return set(db.execute(statement, values).scalars())
+
+    def _copy(self, db: Session, values: List[dict]) -> set:
+        table = self.model.__tablename__
+        columns = ", ".join(values[0])
+        staging = f"import_{table}"
+        db.execute(text(f"CREATE TEMP TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA"))
+
+        buffer = copy_csv(values)
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        inserted = db.execute(text(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+            f"ON CONFLICT ({self.key}) DO NOTHING RETURNING {self.key}"
+        )).scalars()
+        keys = set(inserted)
+        # Conflicting rows are copied again in the same transaction
+        db.execute(text(f"DROP TABLE {staging}"))
+        return keys
+
+def copy_csv(values: List[dict]) -> io.StringIO:
+    """Write rows as CSV for ``COPY ... WITH (FORMAT csv)``, rewound to the start.
+
+    None becomes an unquoted empty field, which COPY reads as NULL. Booleans
+    and datetimes are written in forms Postgres parses regardless of settings.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow([_copy_value(value) for value in row.values()])
+    buffer.seek(0)
+    return buffer
+
+def _copy_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+def read_checkpoint(path: str) -> Optional[ImportProgress]:
+    """Load a checkpoint, None when there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return ImportProgress(**json.load(f))
+
+def write_checkpoint(path: str, progress: ImportProgress) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(asdict(progress), f)
+    os.replace(path + ".tmp", path)
+
+def import_file(db: Session, importer: BulkImporter, path: str, input_format: str,
+                checkpoint_path: str, rejects_path: str) -> ImportProgress:
+    """Import a file from its checkpoint onwards, committing and checkpointing after every batch."""
+    name = os.path.basename(path)
+    progress = read_checkpoint(checkpoint_path) or ImportProgress(input=name, kind=importer.kind)
+    if (progress.input, progress.kind) != (name, importer.kind):
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to a {progress.kind} import of {progress.input}")
+
+    now = utc_naive(datetime.now(timezone.utc))
+    started = time.perf_counter()
+    seconds_before = progress.seconds
+    batch: List[PreparedRow] = []
+    invalid: List[dict] = []
+
+    def flush(next_offset: int) -> None:
+        try:
+            result = importer.load_batch(db, batch, name)
+            db.commit()
+        except (DataError, IntegrityError) as e:
+            # One bad row fails the whole batch, find it row by row instead of stopping the import
+            db.rollback()
+            logger.warning("Batch ending at byte %d failed (%s), loading its rows one by one", next_offset, e.orig)
+            result = importer.load_each(db, batch, name)
+        rejects = invalid + result.rejects
+        if rejects:
+            with open(rejects_path, "a") as f:
+                for reject in rejects:
+                    f.write(json.dumps(reject, default=str) + "\n")
+        progress.offset = next_offset
+        progress.rows += len(batch) + len(invalid)
+        progress.inserted += result.inserted
+        progress.existing += result.existing
+        progress.rejected += len(rejects)
+        progress.seconds = seconds_before + time.perf_counter() - started
+        write_checkpoint(checkpoint_path, progress)
+        logger.info("Imported %d %s rows up to byte %d: %d new, %d existing, %d rejected, %.0f rows/s",
+                    progress.rows, importer.kind, progress.offset, progress.inserted,
+                    progress.existing, progress.rejected, progress.rows_per_second)
+        batch.clear()
+        invalid.clear()
+
+    next_offset = progress.offset
+    for offset, next_offset, record, error in read_records(path, input_format, progress.offset):
+        if error is None:
+            try:
+                batch.append(importer.prepare(name, offset, record, now))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            invalid.append({"offset": offset, "error": error, "record": record})
+        if len(batch) + len(invalid) >= importer.batch_size:
+            flush(next_offset)
+    if batch or invalid or next_offset != progress.offset:
+        flush(next_offset)
+    return progress
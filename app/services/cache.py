@@ -0,0 +1,107 @@
+"""In-process cache of redirect targets keyed by short URL."""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from core.config import settings
+from services.invalidation import LINK_EVENT, invalidation_bus
+
+def utc_naive(value: datetime) -> datetime:
+    """Normalize a datetime to naive UTC, the form stored in the database."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@dataclass(frozen=True)
+class CachedLink:
+    """Immutable snapshot of the link fields needed to serve a redirect."""
+    id: int
+    short_url: str
+    original_url: str
+    is_active: bool
+    expires_at: datetime
+
+    @classmethod
+    def from_link(cls, link) -> "CachedLink":
+        """Build a snapshot from a Link model instance."""
+        return cls(
+            id=link.id,
+            short_url=link.short_url,
+            original_url=link.original_url,
+            is_active=link.is_active,
+            expires_at=utc_naive(link.expires_at),
+        )
+
+    @property
+    def is_accessible(self) -> bool:
+        """Check if the link is accessible (active and not expired)."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return bool(self.is_active and self.expires_at > now)
+
+class RedirectCache:
+    """Thread-safe LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, CachedLink]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache stores anything at all."""
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, short_url: str) -> Optional[CachedLink]:
+        """Return a fresh entry for the short URL, if any."""
+        with self._lock:
+            entry = self._entries.get(short_url)
+            if entry is None:
+                return None
+            stored_at, link = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[short_url]
+                return None
+            self._entries.move_to_end(short_url)
+            return link
+
+    def set(self, link: CachedLink) -> None:
+        """Store a link snapshot, evicting the least recently used entries."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[link.short_url] = (time.monotonic(), link)
+            self._entries.move_to_end(link.short_url)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def set_many(self, links: Iterable[CachedLink]) -> int:
+        """Store several snapshots and return how many were stored."""
+        count = 0
+        for link in links:
+            self.set(link)
+            count += 1
+        return count
+
+    def invalidate(self, short_url: str) -> None:
+        """Drop the entry for a short URL."""
+        with self._lock:
+            self._entries.pop(short_url, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+redirect_cache = RedirectCache(
+    max_size=settings.REDIRECT_CACHE_SIZE,
+    ttl_seconds=settings.REDIRECT_CACHE_TTL_SECONDS,
+)
+invalidation_bus.subscribe(LINK_EVENT, redirect_cache.invalidate)
@@ -0,0 +1,82 @@
+"""Read API over click data exported to day-partitioned Parquet files.
+
+Files are memory-mapped, so aggregate queries never touch the database. This
+module has no database dependency and works wherever the export directory is
+available.
+"""
+
+import os
+from datetime import date
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+CLICK_SCHEMA = pa.schema([
+    ("click_id", pa.int64()),
+    ("clicked_at", pa.timestamp("us")),
+    ("link_id", pa.int64()),
+    ("short_url", pa.string()),
+    ("original_url", pa.string()),
+    ("created_by", pa.string()),
+    ("ip", pa.string()),
+    ("user_agent", pa.string()),
+])
+
+def part_first_id(name: str) -> Optional[int]:
+    """Get the first click id from a part file name, None for other files."""
+    if not (name.startswith("part-") and name.endswith(".parquet")):
+        return None
+    return int(name[len("part-"):].split("-")[0])
+
+class ClickArchive:
+    """Answer aggregate click queries from exported Parquet files."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _files(self, start: Optional[date], end: Optional[date]) -> List[str]:
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for partition in sorted(os.listdir(self.directory)):
+            if not partition.startswith("date="):
+                continue
+            day = date.fromisoformat(partition[len("date="):])
+            if (start and day < start) or (end and day > end):
+                continue
+            partition_path = os.path.join(self.directory, partition)
+            files.extend(
+                os.path.join(partition_path, name)
+                for name in sorted(os.listdir(partition_path))
+                if part_first_id(name) is not None
+            )
+        return files
+
+    def read(self, start: Optional[date] = None, end: Optional[date] = None,
+             columns: Optional[List[str]] = None) -> pa.Table:
+        """Load clicks of the days in [start, end] through memory-mapped files."""
+        tables = [pq.read_table(path, columns=columns, memory_map=True) for path in self._files(start, end)]
+        if not tables:
+            schema = CLICK_SCHEMA if columns is None else pa.schema([CLICK_SCHEMA.field(c) for c in columns])
+            return schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def clicks_by_link(self, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+        """Clicks and last click time per link, ordered by popularity."""
+        table = self.read(start, end, columns=["short_url", "original_url", "click_id", "clicked_at"])
+        grouped = table.group_by(["short_url", "original_url"]).aggregate(
+            [("click_id", "count"), ("clicked_at", "max")]
+        ).rename_columns(["short_url", "original_url", "clicks", "last_clicked"])
+        return grouped.sort_by([("clicks", "descending")]).to_pylist()
+
+    def clicks_by_day(self, start: Optional[date] = None, end: Optional[date] = None,
+                      short_url: Optional[str] = None) -> List[dict]:
+        """Clicks per day, optionally for a single link."""
+        table = self.read(start, end, columns=["short_url", "click_id", "clicked_at"])
+        if short_url is not None:
+            table = table.filter(pc.equal(table["short_url"], short_url))
+        table = table.append_column("day", pc.cast(table["clicked_at"], pa.date32()))
+        grouped = table.group_by("day").aggregate([("click_id", "count")]).rename_columns(["day", "clicks"])
+        return grouped.sort_by("day").to_pylist()
@@ -0,0 +1,144 @@
+"""Incremental export of click data to day-partitioned Parquet files.
+
+Exports go to ``<directory>/date=YYYY-MM-DD/part-<first id>-<last id>.parquet``
+with the link metadata joined in. ``_watermark.json`` records the last exported
+click id, so every run only reads new clicks. Analytical queries are answered
+from the files by ``services.click_archive.ClickArchive``.
+"""
+
+import fcntl
+import json
+import logging
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import SessionLocal
+from models.click import Click
+from models.link import Link
+from models.user_agent import UserAgent
+from services.click_archive import CLICK_SCHEMA, part_first_id
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_FILE = "_watermark.json"
+
+class ClickExporter:
+    """Export clicks newer than the watermark into the export directory."""
+
+    def __init__(self, directory: str, batch_size: int = 50000, safety_lag_seconds: int = 60):
+        self.directory = directory
+        self.batch_size = batch_size
+        # Clicks younger than this may still have uncommitted predecessors with lower ids
+        self.safety_lag = timedelta(seconds=safety_lag_seconds)
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_watermark(self) -> int:
+        """Get the id of the last exported click."""
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return int(json.load(f)["last_click_id"])
+
+    def _write_watermark(self, last_click_id: int) -> None:
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({
+                "last_click_id": last_click_id,
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    def _remove_unacknowledged_parts(self, watermark: int) -> None:
+        """Delete files written by an interrupted run after the watermark was last saved."""
+        for partition in os.listdir(self.directory):
+            partition_path = os.path.join(self.directory, partition)
+            if not (partition.startswith("date=") and os.path.isdir(partition_path)):
+                continue
+            for name in os.listdir(partition_path):
+                first_id = part_first_id(name)
+                if first_id is not None and first_id > watermark:
+                    os.unlink(os.path.join(partition_path, name))
+
+    def export(self, db: Session) -> int:
+        """Export all new clicks and return how many were written."""
+        with self._lock():
+            watermark = self.read_watermark()
+            self._remove_unacknowledged_parts(watermark)
+            exported = 0
+            while True:
+                count, watermark, done = self._export_batch(db, watermark)
+                exported += count
+                if done:
+                    break
+            return exported
+
+    def _export_batch(self, db: Session, watermark: int) -> tuple[int, int, bool]:
+        """Export one batch; return the clicks written, the new watermark and whether the run is done."""
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.safety_lag
+        rows = db.query(
+            Click.id, Click.clicked_at, Click.link_id, Click.ip,
+            Link.short_url, Link.original_url, Link.created_by, UserAgent.value,
+        ).join(Link, Link.id == Click.link_id).outerjoin(
+            UserAgent, UserAgent.id == Click.user_agent_id
+        ).filter(Click.id > watermark).order_by(Click.id).limit(self.batch_size).all()
+
+        partitions = defaultdict(lambda: defaultdict(list))
+        exported = 0
+        for click_id, clicked_at, link_id, ip, short_url, original_url, created_by, user_agent in rows:
+            if clicked_at >= cutoff:
+                break
+            columns = partitions[clicked_at.date()]
+            columns["click_id"].append(click_id)
+            columns["clicked_at"].append(clicked_at)
+            columns["link_id"].append(link_id)
+            columns["short_url"].append(short_url)
+            columns["original_url"].append(original_url)
+            columns["created_by"].append(created_by)
+            columns["ip"].append(ip)
+            columns["user_agent"].append(user_agent)
+            exported += 1
+
+        for day, columns in partitions.items():
+            partition_path = os.path.join(self.directory, f"date={day.isoformat()}")
+            os.makedirs(partition_path, exist_ok=True)
+            ids = columns["click_id"]
+            path = os.path.join(partition_path, f"part-{ids[0]:012d}-{ids[-1]:012d}.parquet")
+            table = pa.table({name: columns[name] for name in CLICK_SCHEMA.names}, schema=CLICK_SCHEMA)
+            pq.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+        if exported:
+            watermark = rows[exported - 1][0]
+            self._write_watermark(watermark)
+            logger.info("Exported %d clicks up to id %d", exported, watermark)
+        # Done once the clicks run out or the safety lag cuts the batch short
+        return exported, watermark, len(rows) < self.batch_size or exported < len(rows)
+
+def export_new_clicks(directory: Optional[str] = None) -> int:
+    """Export clicks newer than the watermark, used by the CLI and as a periodic background job."""
+    exporter = ClickExporter(directory or settings.CLICK_EXPORT_DIR,
+                             batch_size=settings.CLICK_EXPORT_BATCH_SIZE,
+                             safety_lag_seconds=settings.CLICK_EXPORT_SAFETY_LAG_SECONDS)
+    db = SessionLocal()
+    try:
+        return exporter.export(db)
+    finally:
+        db.close()
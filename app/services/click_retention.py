@@ -0,0 +1,147 @@
+"""Retention of raw clicks with compaction into daily aggregates.
+
+Raw clicks older than the retention horizon are folded into per-link daily
+rows of ``click_daily_aggregates`` and deleted, batch by batch, each batch in
+one transaction so no click is ever counted twice or lost. The horizon is
+aligned to midnight UTC: aggregates cover whole days before it and raw clicks
+everything after it, and statistics read both. On a partitioned Postgres
+clicks table whole daily partitions are folded and dropped instead.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import case, delete, select, text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import SessionLocal, dialect_insert, engine
+from db.partitions import (
+    clicks_is_partitioned,
+    compact_and_drop_partition,
+    ensure_click_partitions,
+    list_click_partitions,
+)
+from models.click import Click
+from models.click_aggregate import ClickDailyAggregate
+
+logger = logging.getLogger(__name__)
+
+# Keeps the 30 day statistics window entirely in raw clicks
+MIN_RETENTION_DAYS = 31
+
+def retention_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Midnight UTC before which raw clicks are compacted."""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    days = max(settings.CLICK_RETENTION_DAYS, MIN_RETENTION_DAYS)
+    return (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+class ClickRetentionService:
+    """Service class for compacting old clicks."""
+
+    @staticmethod
+    def compact_batch(db: Session, cutoff: datetime, batch_size: int, max_click_id: Optional[int] = None) -> int:
+        """Fold up to batch_size clicks older than cutoff into daily aggregates, delete them and commit."""
+        query = select(Click.id, Click.link_id, Click.clicked_at).where(Click.clicked_at < cutoff)
+        if max_click_id is not None:
+            query = query.where(Click.id <= max_click_id)
+        rows = db.execute(query.order_by(Click.id).limit(batch_size)).all()
+        if not rows:
+            return 0
+
+        aggregates = defaultdict(lambda: [0, None])
+        for _, link_id, clicked_at in rows:
+            aggregate = aggregates[(link_id, clicked_at.replace(hour=0, minute=0, second=0, microsecond=0))]
+            aggregate[0] += 1
+            if aggregate[1] is None or clicked_at > aggregate[1]:
+                aggregate[1] = clicked_at
+
+        for (link_id, day), (clicks, last_clicked_at) in aggregates.items():
+            ClickRetentionService._add_to_aggregate(db, link_id, day, clicks, last_clicked_at)
+
+        db.execute(delete(Click).where(Click.id.in_([click_id for click_id, _, _ in rows])))
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def _add_to_aggregate(db: Session, link_id: int, day: datetime, clicks: int, last_clicked_at: datetime) -> None:
+        insert = dialect_insert(db)
+        if insert is not None:
+            stmt = insert(ClickDailyAggregate).values(
+                link_id=link_id, day=day, clicks=clicks, last_clicked_at=last_clicked_at
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ClickDailyAggregate.link_id, ClickDailyAggregate.day],
+                set_={
+                    "clicks": ClickDailyAggregate.clicks + stmt.excluded.clicks,
+                    "last_clicked_at": case(
+                        (stmt.excluded.last_clicked_at > ClickDailyAggregate.last_clicked_at,
+                         stmt.excluded.last_clicked_at),
+                        else_=ClickDailyAggregate.last_clicked_at,
+                    ),
+                },
+            )
+            db.execute(stmt)
+            return
+
+        aggregate = db.get(ClickDailyAggregate, (link_id, day))
+        if aggregate is None:
+            db.add(ClickDailyAggregate(link_id=link_id, day=day, clicks=clicks, last_clicked_at=last_clicked_at))
+        else:
+            aggregate.clicks += clicks
+            aggregate.last_clicked_at = max(aggregate.last_clicked_at, last_clicked_at)
+        db.flush()
+
+def _export_watermark() -> Optional[int]:
+    """Last exported click id when exports are enabled, so clicks are never compacted before export."""
+    if not settings.CLICK_EXPORT_DIR:
+        return None
+    from services.click_export import ClickExporter
+    return ClickExporter(settings.CLICK_EXPORT_DIR).read_watermark()
+
+def drop_expired_partitions(cutoff: datetime, max_click_id: Optional[int] = None) -> int:
+    """Fold and drop daily partitions entirely before cutoff, creating upcoming ones."""
+    with engine.begin() as connection:
+        if not clicks_is_partitioned(connection):
+            return 0
+        ensure_click_partitions(connection, cutoff.date(), settings.CLICK_PARTITION_DAYS_AHEAD)
+        expired = [(name, day) for name, day in list_click_partitions(connection)
+                   if day + timedelta(days=1) <= cutoff.date()]
+
+    folded = 0
+    for name, day in expired:
+        with engine.begin() as connection:
+            if max_click_id is not None:
+                newest = connection.execute(text(f"SELECT max(id) FROM {name}")).scalar()
+                if newest is not None and newest > max_click_id:
+                    # Not exported yet, retried on the next run
+                    continue
+            folded += compact_and_drop_partition(connection, name)
+        logger.info("Compacted and dropped click partition %s (%s)", name, day)
+    return folded
+
+def compact_old_clicks() -> int:
+    """Apply the retention policy, used as a periodic background job."""
+    cutoff = retention_cutoff()
+    max_click_id = _export_watermark()
+    compacted = 0
+
+    if settings.CLICK_PARTITIONING:
+        compacted += drop_expired_partitions(cutoff, max_click_id)
+
+    # Rows left in non-daily partitions or in an unpartitioned table
+    db = SessionLocal()
+    try:
+        while True:
+            count = ClickRetentionService.compact_batch(db, cutoff, settings.CLICK_RETENTION_BATCH_SIZE, max_click_id)
+            compacted += count
+            if count < settings.CLICK_RETENTION_BATCH_SIZE:
+                break
+    finally:
+        db.close()
+
+    if compacted:
+        logger.info("Compacted %d clicks older than %s into daily aggregates", compacted, cutoff)
+    return compacted
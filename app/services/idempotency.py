@@ -0,0 +1,143 @@
+"""Idempotency keys for safely retried requests.
+
+A request sent with an ``Idempotency-Key`` header claims the key for its user
+before doing any work, and stores its response with the key when it finishes.
+Retries with the same key and body get the stored response back instead of
+repeating the request. The response is stored in the transaction making the
+request's changes, so a key is either completed with them or left in progress
+with none. Keys expire after ``IDEMPOTENCY_KEY_TTL_HOURS``; a key left in
+progress by a crashed request is taken over after ``IDEMPOTENCY_LOCK_SECONDS``.
+When the slow request then finishes after the one that took over, it finds the
+key completed and must roll back.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import SessionLocal
+from models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyConflict(Exception):
+    """The key is used by a request in progress or was used with a different body."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """Response of the first request made with a key."""
+    status_code: int
+    body: dict
+
+def request_hash(payload: dict) -> str:
+    """SHA-256 of a request body, to detect a key reused for a different request."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class IdempotencyService:
+    """Service class for idempotency keys."""
+
+    @staticmethod
+    def claim(db: Session, username: str, key: str, body_hash: str) -> Optional[StoredResponse]:
+        """Claim a key for a new request, or return the stored response of an earlier one.
+
+        Raises IdempotencyConflict when the key is in progress or belongs to a different request.
+        """
+        now = _now()
+        # Expired keys and stale claims are released first
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.username == username,
+            IdempotencyKey.key == key,
+            (IdempotencyKey.expires_at <= now) | (
+                IdempotencyKey.status_code.is_(None)
+                & (IdempotencyKey.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS))
+            ),
+        ))
+        db.add(IdempotencyKey(
+            username=username,
+            key=key,
+            request_hash=body_hash,
+            created_at=now,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        record = db.execute(select(IdempotencyKey).where(
+            IdempotencyKey.username == username, IdempotencyKey.key == key
+        )).scalar_one_or_none()
+        if record is None or record.status_code is None:
+            raise IdempotencyConflict(409, "A request with this Idempotency-Key is in progress")
+        if record.request_hash != body_hash:
+            raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+        return StoredResponse(status_code=record.status_code, body=json.loads(record.response_body))
+
+    @staticmethod
+    def complete(db: Session, username: str, key: str, body_hash: str, status_code: int, body: dict) -> bool:
+        """Store the response of the request holding a key, in the caller's transaction.
+
+        Returns False when the key was taken over by a request that already
+        completed it, or that has a different body; the caller must roll back.
+        """
+        return db.execute(update(IdempotencyKey).where(
+            IdempotencyKey.username == username,
+            IdempotencyKey.key == key,
+            IdempotencyKey.request_hash == body_hash,
+            IdempotencyKey.status_code.is_(None),
+        ).values(status_code=status_code, response_body=json.dumps(body, default=str))).rowcount == 1
+
+    @staticmethod
+    def release(db: Session, username: str, key: str) -> None:
+        """Release a key whose request failed, so a retry runs it again."""
+        db.rollback()
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.username == username,
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+        ))
+        db.commit()
+
+    @staticmethod
+    def delete_expired(db: Session, batch_size: int = 1000) -> int:
+        """Delete expired keys in batches and return how many were removed."""
+        deleted = 0
+        while True:
+            batch = select(IdempotencyKey.username, IdempotencyKey.key).where(
+                IdempotencyKey.expires_at <= _now()
+            ).limit(batch_size)
+            count = db.execute(delete(IdempotencyKey).where(
+                tuple_(IdempotencyKey.username, IdempotencyKey.key).in_(batch)
+            )).rowcount
+            db.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+def delete_expired_idempotency_keys() -> int:
+    """Delete expired idempotency keys, used as a periodic background job."""
+    db = SessionLocal()
+    try:
+        deleted = IdempotencyService.delete_expired(db)
+        if deleted:
+            logger.info("Deleted %d expired idempotency keys", deleted)
+        return deleted
+    finally:
+        db.close()
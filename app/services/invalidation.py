@@ -0,0 +1,255 @@
+"""Cache invalidation bus shared by all worker processes.
+
+Every worker keeps its own redirect and auth caches. When one worker changes a
+link or a user it publishes an event on the bus; the event is applied to the
+local caches immediately and broadcast to the other workers by the configured
+backend:
+
+- ``inprocess``: no broadcast, suitable for a single worker.
+- ``unix``: Unix datagram sockets in ``INVALIDATION_SOCKET_DIR``, one per
+  worker. Needs no external services, only a directory shared by the workers
+  of one host.
+- ``postgres``: ``LISTEN``/``NOTIFY`` on ``INVALIDATION_CHANNEL``, which also
+  reaches workers on other hosts.
+
+Staleness guarantees: an event normally reaches the other workers within
+milliseconds of the commit. Delivery is best effort (a full socket buffer, a
+worker that is restarting or a dropped Postgres listener connection can lose
+events), so every cache entry also carries a TTL. A worker therefore never
+serves data older than ``REDIRECT_CACHE_TTL_SECONDS`` for redirects and
+``AUTH_CACHE_TTL_SECONDS`` for credentials, whatever happens to the bus.
+"""
+
+import json
+import logging
+import os
+import re
+import select
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LINK_EVENT = "link"
+USER_EVENT = "user"
+
+class InProcessBackend:
+    """Backend for a single worker: nothing is broadcast."""
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        pass
+
+    def publish(self, payload: str) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+class UnixSocketBackend:
+    """Broadcast events to the workers of one host over Unix datagram sockets."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._path = None
+        self._socket = None
+        self._sender = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self._path)
+        self._socket.settimeout(0.5)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, args=(deliver,),
+                                        name="invalidation-unix", daemon=True)
+        self._thread.start()
+
+    def _listen(self, deliver: Callable[[str], None]) -> None:
+        while not self._stopped.is_set():
+            try:
+                data = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            deliver(data.decode())
+
+    def publish(self, payload: str) -> None:
+        if self._sender is None:
+            return
+        data = payload.encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == self._path:
+                continue
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that is gone
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                logger.warning("Dropped invalidation event for %s: %s", path, e)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for sock in (self._socket, self._sender):
+            if sock is not None:
+                sock.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self._path and os.path.exists(self._path):
+            os.unlink(self._path)
+        self._socket = self._sender = self._thread = None
+
+class PostgresNotifyBackend:
+    """Broadcast events to every worker connected to the database with LISTEN/NOTIFY."""
+
+    def __init__(self, engine, channel: str):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", channel):
+            raise ValueError(f"Invalid invalidation channel name '{channel}'")
+        self.engine = engine
+        self.channel = channel
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, args=(deliver,),
+                                        name="invalidation-postgres", daemon=True)
+        self._thread.start()
+
+    def _listen(self, deliver: Callable[[str], None]) -> None:
+        import psycopg2
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stopped.is_set():
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        deliver(connection.notifies.pop(0).payload)
+                connection.close()
+            except Exception as e:
+                # Events published while reconnecting are lost, cache TTLs bound the staleness
+                logger.warning("Invalidation listener disconnected: %s", e)
+                time.sleep(1)
+
+    def publish(self, payload: str) -> None:
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": self.channel, "payload": payload})
+            connection.commit()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+class InvalidationBus:
+    """Publish link and user change events to the caches of every worker."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sender_id = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._started = False
+
+    def subscribe(self, kind: str, callback: Callable[[str], None]) -> None:
+        """Register a callback receiving the key of every event of a kind."""
+        callbacks = self._subscribers.setdefault(kind, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self, kind: str, callback: Callable[[str], None]) -> None:
+        """Stop passing events of a kind to a callback registered with subscribe."""
+        # Replaced rather than changed in place, events may be dispatched concurrently
+        self._subscribers[kind] = [c for c in self._subscribers.get(kind, []) if c != callback]
+
+    def start(self) -> None:
+        """Start receiving events from other workers."""
+        if not self._started:
+            # Regenerated here so that workers forked from one parent do not share it
+            self.sender_id = uuid.uuid4().hex
+            self.backend.start(self._receive)
+            self._started = True
+
+    def stop(self) -> None:
+        """Stop receiving events from other workers."""
+        if self._started:
+            self.backend.stop()
+            self._started = False
+
+    def publish(self, kind: str, keys: List[str]) -> None:
+        """Apply events locally and broadcast them to the other workers."""
+        if not keys:
+            return
+        self._dispatch(kind, keys)
+        if not self._started:
+            return
+        # Keep payloads well below the Unix datagram and NOTIFY size limits
+        for start in range(0, len(keys), 100):
+            payload = json.dumps({"sender": self.sender_id, "kind": kind, "keys": keys[start:start + 100]})
+            try:
+                self.backend.publish(payload)
+            except Exception as e:
+                logger.warning("Failed to broadcast invalidation event: %s", e)
+
+    def publish_link(self, short_url: str) -> None:
+        """Announce that a link was changed or deleted."""
+        self.publish(LINK_EVENT, [short_url])
+
+    def publish_user(self, username: str) -> None:
+        """Announce that a user was changed or deactivated."""
+        self.publish(USER_EVENT, [username])
+
+    def _receive(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation event")
+            return
+        if event.get("sender") != self.sender_id:
+            self._dispatch(event.get("kind"), event.get("keys", []))
+
+    def _dispatch(self, kind: str, keys: List[str]) -> None:
+        for callback in self._subscribers.get(kind, []):
+            for key in keys:
+                try:
+                    callback(key)
+                except Exception:
+                    logger.exception("Invalidation callback failed for %s '%s'", kind, key)
+
+def create_backend(name: str):
+    """Create the backend selected by INVALIDATION_BACKEND."""
+    if name == "inprocess":
+        return InProcessBackend()
+    if name == "unix":
+        return UnixSocketBackend(settings.INVALIDATION_SOCKET_DIR)
+    if name == "postgres":
+        from db.database import engine
+        return PostgresNotifyBackend(engine, settings.INVALIDATION_CHANNEL)
+    raise ValueError(f"Unknown invalidation backend '{name}'")
+
+invalidation_bus = InvalidationBus(create_backend(settings.INVALIDATION_BACKEND))
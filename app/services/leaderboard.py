@@ -0,0 +1,276 @@
+"""Materialized leaderboard of link statistics, refreshed incrementally.
+
+``/api/stats`` is served from an in-memory snapshot of every link's totals and
+window counts, ordered by popularity, instead of aggregating all clicks on
+each call. Each worker keeps its own snapshot. A background task refreshes it
+every ``LEADERBOARD_REFRESH_INTERVAL_SECONDS`` from a click id watermark:
+
+- clicks with an id above the watermark are added to the totals and windows,
+  stopping at clicks younger than ``LEADERBOARD_SAFETY_LAG_SECONDS``, which
+  may still have uncommitted predecessors with lower ids;
+- clicks that slid out of a window since the previous refresh are subtracted,
+  read from the ``clicked_at`` index between the old and new window starts;
+- links created since are added, and links named in link invalidation events
+  get their metadata reloaded or are dropped once deleted. Those are read from
+  the primary, as the events can arrive before the replica has the change.
+
+A full rebuild runs at startup of the task and every
+``LEADERBOARD_REBUILD_INTERVAL_SECONDS``, correcting any drift. The snapshot
+is complete up to its ``as_of`` time; the endpoint falls back to the live
+query when it is older than ``LEADERBOARD_MAX_STALENESS_SECONDS``.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import ReadSessionLocal, SessionLocal
+from models.click import Click
+from models.click_counter import LinkClickShard
+from models.link import Link
+from services.cache import utc_naive
+from services.invalidation import LINK_EVENT, invalidation_bus
+from services.link_service import LinkService
+from services.stats_windows import DEFAULT_WINDOWS, LEGACY_WINDOWS, parse_windows
+
+logger = logging.getLogger(__name__)
+
+SPANS = list(LEGACY_WINDOWS.values())
+# Labels of the default windows, reported in LinkStats.windows like the live query does
+WINDOW_LABELS = {label: SPANS.index(span) for label, span in parse_windows(DEFAULT_WINDOWS).items()}
+
+@dataclass(slots=True)
+class LeaderboardEntry:
+    """Running statistics of one link."""
+    id: int
+    short_url: str
+    original_url: str
+    created_at: datetime
+    is_active: bool
+    click_count: int
+    last_clicked: Optional[datetime]
+    # Clicks per span of SPANS
+    windows: List[int]
+
+    def as_stats(self) -> dict:
+        """Statistics in the form returned by LinkService.get_all_enhanced_stats."""
+        return {
+            'short_url': self.short_url,
+            'original_url': self.original_url,
+            'click_count': self.click_count,
+            'created_at': self.created_at,
+            'is_active': self.is_active,
+            'last_clicked': self.last_clicked,
+            **{field: self.windows[i] for i, field in enumerate(LEGACY_WINDOWS)},
+            'windows': {label: self.windows[i] for label, i in WINDOW_LABELS.items()},
+        }
+
+class Leaderboard:
+    """Per-process snapshot of all link statistics, ordered by popularity."""
+
+    def __init__(self, batch_size: int = 10000, safety_lag_seconds: float = 2,
+                 rebuild_interval_seconds: float = 3600):
+        self.batch_size = batch_size
+        self.safety_lag = timedelta(seconds=safety_lag_seconds)
+        self.rebuild_interval_seconds = rebuild_interval_seconds
+        self._entries: Dict[int, LeaderboardEntry] = {}
+        self._ids_by_short_url: Dict[str, int] = {}
+        # Last click counted, last link seen and the start of each window at the last refresh
+        self._click_watermark = 0
+        self._link_watermark = 0
+        self._window_starts: List[datetime] = []
+        self._rebuilt_at: Optional[float] = None
+        # (as_of, stats ordered by popularity), replaced as a whole so readers need no lock
+        self._snapshot: Optional[tuple[datetime, List[dict]]] = None
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def mark_dirty(self, short_url: str) -> None:
+        """Reload the metadata of a link at the next refresh, called on link invalidation events."""
+        with self._dirty_lock:
+            self._dirty.add(short_url)
+
+    def snapshot(self, max_staleness_seconds: float, now: Optional[datetime] = None) -> Optional[tuple[datetime, List[dict]]]:
+        """The (as_of, stats) snapshot, or None when there is none fresh enough."""
+        snapshot = self._snapshot
+        now = utc_naive(now or datetime.now(timezone.utc))
+        if snapshot is None or now - snapshot[0] > timedelta(seconds=max_staleness_seconds):
+            return None
+        return snapshot
+
+    def refresh(self, db: Session, now: Optional[datetime] = None, primary_db: Optional[Session] = None) -> None:
+        """Bring the snapshot up to date, with a full rebuild when one is due.
+
+        Invalidated links are reloaded from primary_db when given, db otherwise.
+        """
+        now = utc_naive(now or datetime.now(timezone.utc))
+        with self._refresh_lock:
+            if self._rebuilt_at is None or time.monotonic() - self._rebuilt_at >= self.rebuild_interval_seconds:
+                self._rebuild(db, now)
+                changed = True
+            else:
+                # Slide before adding, so clicks added now are never subtracted for the old window starts
+                changed = self._add_new_links(db)
+                changed = self._slide_windows(db, now) or changed
+                changed = self._add_new_clicks(db, now) or changed
+                changed = self._reload_dirty(primary_db or db) or changed
+            self._publish(now - self.safety_lag, changed)
+
+    def _rebuild(self, db: Session, now: datetime) -> None:
+        with self._dirty_lock:
+            self._dirty.clear()
+        link_ids = select(Link.id).where(Link.deleted_at.is_(None))
+        # Read in the same statement as the totals, so both see the same committed clicks and links
+        watermarks = [
+            select(func.coalesce(func.max(Click.id), 0)).scalar_subquery(),
+            select(func.coalesce(func.max(Link.id), 0)).scalar_subquery(),
+        ]
+        query = LinkService.windowed_stats_query(link_ids, SPANS, now).add_columns(*watermarks)
+
+        entries = {}
+        click_watermark = link_watermark = None
+        for link, click_count, last_clicked, *counts, click_watermark, link_watermark in db.execute(query):
+            entries[link.id] = LeaderboardEntry(link.id, link.short_url, link.original_url, link.created_at,
+                                                link.is_active, click_count, last_clicked, counts)
+        if click_watermark is None:
+            click_watermark, link_watermark = db.execute(select(*watermarks)).one()
+
+        self._entries = entries
+        self._ids_by_short_url = {entry.short_url: link_id for link_id, entry in entries.items()}
+        self._click_watermark = click_watermark
+        self._link_watermark = link_watermark
+        self._window_starts = [now - span for span in SPANS]
+        self._rebuilt_at = time.monotonic()
+        logger.info("Leaderboard rebuilt with %d links up to click %d", len(entries), click_watermark)
+
+    def _add_new_links(self, db: Session) -> bool:
+        pending = select(func.coalesce(func.sum(LinkClickShard.count), 0)).where(
+            LinkClickShard.link_id == Link.id
+        ).scalar_subquery()
+        # Clicks above the watermark are added when they are read, leave them out of the total
+        uncounted = select(func.count(Click.id)).where(
+            Click.link_id == Link.id, Click.id > self._click_watermark
+        ).scalar_subquery()
+        rows = db.execute(
+            select(Link, Link.click_count + pending - uncounted)
+            .where(Link.id > self._link_watermark)
+            .order_by(Link.id)
+        ).all()
+        for link, click_count in rows:
+            # Deleted links still move the watermark, so clicks on them are not waited for
+            self._link_watermark = link.id
+            if link.deleted_at is not None:
+                continue
+            self._entries[link.id] = LeaderboardEntry(link.id, link.short_url, link.original_url, link.created_at,
+                                                      link.is_active, click_count, None, [0] * len(SPANS))
+            self._ids_by_short_url[link.short_url] = link.id
+        return bool(rows)
+
+    def _add_new_clicks(self, db: Session, now: datetime) -> bool:
+        cutoff = now - self.safety_lag
+        window_starts = [now - span for span in SPANS]
+        added = 0
+        while True:
+            rows = db.execute(
+                select(Click.id, Click.link_id, Click.clicked_at)
+                .where(Click.id > self._click_watermark)
+                .order_by(Click.id).limit(self.batch_size)
+            ).all()
+            for click_id, link_id, clicked_at in rows:
+                if clicked_at >= cutoff or link_id > self._link_watermark:
+                    # Too young, or on a link created after _add_new_links ran: read at the next refresh
+                    return bool(added)
+                self._click_watermark = click_id
+                entry = self._entries.get(link_id)
+                if entry is None:
+                    # Deleted link
+                    continue
+                entry.click_count += 1
+                if entry.last_clicked is None or clicked_at > entry.last_clicked:
+                    entry.last_clicked = clicked_at
+                for i, start in enumerate(window_starts):
+                    if clicked_at >= start:
+                        entry.windows[i] += 1
+                added += 1
+            if len(rows) < self.batch_size:
+                return bool(added)
+
+    def _slide_windows(self, db: Session, now: datetime) -> bool:
+        changed = False
+        for i, span in enumerate(SPANS):
+            start, new_start = self._window_starts[i], now - span
+            if new_start <= start:
+                continue
+            rows = db.execute(
+                select(Click.link_id, func.count(Click.id))
+                .where(Click.clicked_at >= start, Click.clicked_at < new_start,
+                       Click.id <= self._click_watermark)
+                .group_by(Click.link_id)
+            ).all()
+            for link_id, count in rows:
+                entry = self._entries.get(link_id)
+                if entry is not None:
+                    entry.windows[i] = max(entry.windows[i] - count, 0)
+                    changed = True
+            self._window_starts[i] = new_start
+        return changed
+
+    def _reload_dirty(self, db: Session) -> bool:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return False
+        ids = {self._ids_by_short_url[short_url] for short_url in dirty if short_url in self._ids_by_short_url}
+        links = db.query(Link).filter(Link.short_url.in_(dirty) | Link.id.in_(ids)).all()
+        for link in links:
+            entry = self._entries.get(link.id)
+            if entry is None:
+                # Created since the last refresh, _add_new_links picks it up
+                continue
+            if link.deleted_at is not None:
+                self._drop(link.id)
+                continue
+            self._ids_by_short_url.pop(entry.short_url, None)
+            entry.short_url = link.short_url
+            entry.original_url = link.original_url
+            entry.is_active = link.is_active
+            self._ids_by_short_url[link.short_url] = link.id
+        # Purged links are gone from the table
+        for link_id in ids - {link.id for link in links}:
+            self._drop(link_id)
+        return True
+
+    def _drop(self, link_id: int) -> None:
+        entry = self._entries.pop(link_id, None)
+        if entry is not None and self._ids_by_short_url.get(entry.short_url) == link_id:
+            del self._ids_by_short_url[entry.short_url]
+
+    def _publish(self, as_of: datetime, changed: bool) -> None:
+        if not changed and self._snapshot is not None:
+            self._snapshot = (as_of, self._snapshot[1])
+            return
+        ordered = sorted(self._entries.values(), key=lambda entry: (-entry.click_count, entry.id))
+        self._snapshot = (as_of, [entry.as_stats() for entry in ordered])
+
+leaderboard = Leaderboard(batch_size=settings.LEADERBOARD_BATCH_SIZE,
+                          safety_lag_seconds=settings.LEADERBOARD_SAFETY_LAG_SECONDS,
+                          rebuild_interval_seconds=settings.LEADERBOARD_REBUILD_INTERVAL_SECONDS)
+invalidation_bus.subscribe(LINK_EVENT, leaderboard.mark_dirty)
+
+def refresh_leaderboard() -> None:
+    """Refresh the leaderboard snapshot, used as a periodic background job."""
+    db = ReadSessionLocal()
+    primary_db = SessionLocal()
+    try:
+        leaderboard.refresh(db, primary_db=primary_db)
+    finally:
+        primary_db.close()
+        db.close()
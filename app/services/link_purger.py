@@ -0,0 +1,130 @@
+"""Background removal of deleted links and their clicks.
+
+Deleting a link only sets ``deleted_at``; this job removes the rows later. By
+default clicks are deleted in bounded batches, each in its own short
+transaction, so a link with millions of clicks never holds locks for long or
+loads its clicks into memory. With ``LINK_PURGE_USE_DB_CASCADE`` enabled, and
+when the foreign keys were created with ``ON DELETE CASCADE``, the link row is
+deleted directly and the database removes the dependent rows.
+"""
+
+import logging
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import SessionLocal, engine
+from models.click import Click
+from models.click_aggregate import ClickDailyAggregate
+from models.click_counter import LinkClickShard
+from models.link import Link
+
+logger = logging.getLogger(__name__)
+
+# Tables referencing links, emptied for a link before its row is deleted.
+# Clicks can be millions of rows per link and are deleted in batches by id.
+BATCHED_DEPENDENT_TABLES = [Click.__table__]
+SMALL_DEPENDENT_TABLES = [LinkClickShard.__table__, ClickDailyAggregate.__table__]
+
+@dataclass
+class PurgeProgress:
+    """Progress of the purger, updated after every batch."""
+    links_pending: int = 0
+    links_purged: int = 0
+    clicks_deleted: int = 0
+    current_link_id: Optional[int] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    errors: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        """Progress as a plain dictionary, for logs and status output."""
+        return asdict(self)
+
+def db_cascade_available() -> bool:
+    """Check that every table referencing links deletes its rows with ON DELETE CASCADE."""
+    if engine.dialect.name != "postgresql":
+        # SQLite only enforces foreign keys when enabled per connection
+        return False
+    inspector = inspect(engine)
+    for table in BATCHED_DEPENDENT_TABLES + SMALL_DEPENDENT_TABLES:
+        foreign_keys = [fk for fk in inspector.get_foreign_keys(table.name) if fk["referred_table"] == "links"]
+        if not foreign_keys or any(
+            (fk.get("options") or {}).get("ondelete", "").upper() != "CASCADE" for fk in foreign_keys
+        ):
+            return False
+    return True
+
+class LinkPurger:
+    """Remove deleted links in bounded batches and report progress."""
+
+    def __init__(self, batch_size: int, use_db_cascade: bool = False):
+        self.batch_size = batch_size
+        self.use_db_cascade = use_db_cascade
+        self.progress = PurgeProgress()
+        self._lock = threading.Lock()
+
+    def purge(self, db: Session) -> PurgeProgress:
+        """Purge every deleted link and return the progress of this run."""
+        if not self._lock.acquire(blocking=False):
+            return self.progress
+        try:
+            use_db_cascade = self.use_db_cascade and db_cascade_available()
+            link_ids = db.execute(
+                select(Link.id).where(Link.deleted_at.is_not(None)).order_by(Link.deleted_at)
+            ).scalars().all()
+            self.progress = PurgeProgress(links_pending=len(link_ids),
+                                          started_at=datetime.now(timezone.utc).replace(tzinfo=None))
+
+            for link_id in link_ids:
+                self.progress.current_link_id = link_id
+                try:
+                    if not use_db_cascade:
+                        self._delete_dependents(db, link_id)
+                    db.execute(delete(Link).where(Link.id == link_id, Link.deleted_at.is_not(None)))
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.exception("Failed to purge link %d", link_id)
+                    self.progress.errors.append(f"link {link_id}: {e}")
+                    continue
+                self.progress.links_pending -= 1
+                self.progress.links_purged += 1
+
+            self.progress.current_link_id = None
+            self.progress.finished_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            if self.progress.links_purged:
+                logger.info("Purged %d deleted links and %d clicks",
+                            self.progress.links_purged, self.progress.clicks_deleted)
+            return self.progress
+        finally:
+            self._lock.release()
+
+    def _delete_dependents(self, db: Session, link_id: int) -> None:
+        for table in BATCHED_DEPENDENT_TABLES:
+            while True:
+                batch = select(table.c.id).where(table.c.link_id == link_id).limit(self.batch_size)
+                deleted = db.execute(delete(table).where(table.c.id.in_(batch.scalar_subquery()))).rowcount
+                db.commit()
+                self.progress.clicks_deleted += deleted
+                if deleted < self.batch_size:
+                    break
+                logger.info("Purging link %d: %d clicks deleted so far", link_id, self.progress.clicks_deleted)
+        for table in SMALL_DEPENDENT_TABLES:
+            db.execute(delete(table).where(table.c.link_id == link_id))
+
+link_purger = LinkPurger(batch_size=settings.LINK_PURGE_BATCH_SIZE,
+                         use_db_cascade=settings.LINK_PURGE_USE_DB_CASCADE)
+
+def purge_deleted_links() -> PurgeProgress:
+    """Purge deleted links, used as a periodic background job."""
+    db = SessionLocal()
+    try:
+        return link_purger.purge(db)
+    finally:
+        db.close()
@@ -5,11 +5,19 @@ import string
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, case, desc, func, literal, select, union_all, update
 
 from models.link import Link
 from models.click import Click
-from schemas.link import LinkCreate, LinkUpdate
+from models.click_aggregate import ClickDailyAggregate
+from models.click_counter import LinkClickShard
+from schemas.link import LinkCreate, LinkUpdate, LinkBulkUpdate
+from services.cache import CachedLink, redirect_cache, utc_naive
+from services.click_counter import ClickCounterService
+from services.invalidation import LINK_EVENT, invalidation_bus
+from services.stats_windows import LEGACY_WINDOWS, parse_windows
+from services.urls import url_hash
+from services.user_agents import user_agent_registry
 from core.config import settings
 
 class LinkService:
@@ -26,7 +34,7 @@ class LinkService:
     
     @staticmethod
     def create_link(db: Session, link_data: LinkCreate, username: str) -> Link:
-        """Create a new shortened link."""
+        """Create a new shortened link, flushed but left for the caller to commit."""
         # Generate unique short URL
         short_url = LinkService.generate_short_url()
         
@@ -41,20 +49,32 @@ class LinkService:
         db_link = Link(
             short_url=short_url,
             original_url=link_data.original_url,
+            url_hash=url_hash(link_data.original_url),
             expires_at=expires_at,
             created_by=username
         )
         
         db.add(db_link)
-        db.commit()
+        db.flush()
         db.refresh(db_link)
         
         return db_link
     
+    @staticmethod
+    def find_reusable_link(db: Session, username: str, original_url: str) -> Optional[Link]:
+        """Find an active, unexpired link of the user to the same normalized URL."""
+        return db.query(Link).filter(
+            Link.created_by == username,
+            Link.url_hash == url_hash(original_url),
+            Link.is_active.is_(True),
+            Link.deleted_at.is_(None),
+            Link.expires_at > utc_naive(datetime.now(timezone.utc)),
+        ).order_by(desc(Link.expires_at)).first()
+    
     @staticmethod
     def get_link_by_short_url(db: Session, short_url: str) -> Optional[Link]:
-        """Get a link by its short URL."""
-        return db.query(Link).filter(Link.short_url == short_url).first()
+        """Get a link by its short URL, ignoring deleted links."""
+        return db.query(Link).filter(Link.short_url == short_url, Link.deleted_at.is_(None)).first()
     
     @staticmethod
     def get_accessible_link(db: Session, short_url: str) -> Optional[Link]:
@@ -63,27 +83,65 @@ class LinkService:
             and_(
                 Link.short_url == short_url,
                 Link.is_active == True,
+                Link.deleted_at.is_(None),
                 Link.expires_at > datetime.now(timezone.utc)
             )
         ).first()
         return link
     
     @staticmethod
-    def increment_click_count(db: Session, link: Link, ip_address: str = None, user_agent: str = None) -> Link:
+    def resolve_redirect(db: Session, short_url: str) -> Optional[CachedLink]:
+        """Get an accessible link for redirecting, served from the redirect cache when possible."""
+        cached = redirect_cache.get(short_url)
+        if cached is not None:
+            return cached if cached.is_accessible else None
+        
+        link = LinkService.get_accessible_link(db, short_url)
+        if not link:
+            return None
+        
+        cached = CachedLink.from_link(link)
+        redirect_cache.set(cached)
+        return cached
+    
+    @staticmethod
+    def warm_redirect_cache(db: Session, top_n: int, recent_n: int) -> int:
+        """Preload the most clicked and most recently created accessible links into the redirect cache."""
+        accessible = db.query(Link).filter(
+            and_(
+                Link.is_active == True,
+                Link.deleted_at.is_(None),
+                Link.expires_at > datetime.now(timezone.utc)
+            )
+        )
+        
+        links = {}
+        # Load recent links first so that popular ones end up most recently used
+        if recent_n > 0:
+            for link in accessible.order_by(desc(Link.created_at)).limit(recent_n):
+                links[link.short_url] = link
+        if top_n > 0:
+            for link in accessible.order_by(desc(Link.click_count)).limit(top_n):
+                links.pop(link.short_url, None)
+                links[link.short_url] = link
+        
+        return redirect_cache.set_many(CachedLink.from_link(link) for link in links.values())
+    
+    @staticmethod
+    def increment_click_count(db: Session, link: Link | CachedLink, ip_address: str = None, user_agent: str = None) -> None:
         """Increment the click count for a link and record detailed click data."""
         # Create detailed click record
         click_record = Click(
             link_id=link.id,
-            ip_address=ip_address,
-            user_agent=user_agent,
+            ip=ip_address,
+            user_agent_id=user_agent_registry.get_id(db, user_agent),
             clicked_at=datetime.now(timezone.utc)
         )
         db.add(click_record)
         
-        # Update total click count
-        link.click_count += 1
+        # Count the click on a shard, folded into Link.click_count in the background
+        ClickCounterService.increment(db, link.id)
         db.commit()
-        db.refresh(link)
     
     @staticmethod
     def get_user_links(
@@ -94,7 +152,7 @@ class LinkService:
         active: Optional[bool] = None
     ) -> tuple[List[Link], int]:
         """Get paginated links for a user with optional filtering."""
-        query = db.query(Link).filter(Link.created_by == username)
+        query = db.query(Link).filter(Link.created_by == username, Link.deleted_at.is_(None))
         
         # Apply active filter if provided
         if active is not None:
@@ -123,82 +181,159 @@ class LinkService:
         
         db.commit()
         db.refresh(link)
+        invalidation_bus.publish_link(link.short_url)
         
         return link
     
+    @staticmethod
+    def bulk_update_links(
+        db: Session,
+        username: str,
+        bulk_update: LinkBulkUpdate,
+        batch_size: int = 500
+    ) -> tuple[int, List[str]]:
+        """Update the user's links selected by short URLs or a filter with one UPDATE per batch.
+        
+        Returns the number of updated links and the requested short URLs that were not found.
+        """
+        now = datetime.now(timezone.utc)
+        values = {}
+        if bulk_update.is_active is not None:
+            values['is_active'] = bulk_update.is_active
+        if bulk_update.expires_in_days is not None:
+            values['expires_at'] = now + timedelta(days=bulk_update.expires_in_days)
+        
+        def apply(condition) -> List[tuple]:
+            statement = update(Link).where(condition).values(**values).returning(Link.id, Link.short_url)
+            rows = db.execute(statement.execution_options(synchronize_session=False)).all()
+            db.commit()
+            invalidation_bus.publish(LINK_EVENT, [short_url for _, short_url in rows])
+            return rows
+        
+        owned = and_(Link.created_by == username, Link.deleted_at.is_(None))
+        
+        if bulk_update.short_urls is not None:
+            requested = list(dict.fromkeys(bulk_update.short_urls))
+            updated = set()
+            for start in range(0, len(requested), batch_size):
+                chunk = requested[start:start + batch_size]
+                rows = apply(and_(owned, Link.short_url.in_(chunk)))
+                updated.update(short_url for _, short_url in rows)
+            return len(updated), [short_url for short_url in requested if short_url not in updated]
+        
+        conditions = [owned]
+        link_filter = bulk_update.filter
+        if link_filter.created_before is not None:
+            conditions.append(Link.created_at < utc_naive(link_filter.created_before))
+        if link_filter.expired is True:
+            conditions.append(Link.expires_at <= now)
+        elif link_filter.expired is False:
+            conditions.append(Link.expires_at > now)
+        if link_filter.url_prefix:
+            conditions.append(Link.original_url.startswith(link_filter.url_prefix, autoescape=True))
+        
+        # Walk the matching links in id order so links that stop matching once updated are not revisited
+        total = 0
+        last_id = 0
+        while True:
+            batch_ids = select(Link.id).where(*conditions, Link.id > last_id).order_by(Link.id).limit(batch_size)
+            rows = apply(Link.id.in_(batch_ids.scalar_subquery()))
+            total += len(rows)
+            if len(rows) < batch_size:
+                return total, []
+            last_id = max(link_id for link_id, _ in rows)
+    
     @staticmethod
     def delete_link(db: Session, link: Link) -> bool:
-        """Delete a link."""
-        db.delete(link)
+        """Delete a link: it disappears immediately, its rows are purged in the background."""
+        link.deleted_at = datetime.now(timezone.utc)
+        link.is_active = False
         db.commit()
+        invalidation_bus.publish_link(link.short_url)
         return True
     
     @staticmethod
     def get_all_links_stats(db: Session) -> List[Link]:
         """Get all links ordered by click count for statistics."""
-        return db.query(Link).order_by(desc(Link.click_count)).all()
+        return db.query(Link).filter(Link.deleted_at.is_(None)).order_by(desc(Link.click_count)).all()
     
     @staticmethod
     def get_link_stats(db: Session, short_url: str) -> Optional[Link]:
         """Get statistics for a specific link."""
-        return db.query(Link).filter(Link.short_url == short_url).first()
+        return LinkService.get_link_by_short_url(db, short_url)
 
     @staticmethod
-    def calculate_time_based_clicks(db: Session, link_id: int) -> dict:
-        """Calculate clicks for different time periods."""
-        now = datetime.now(timezone.utc)
-        
-        # Define time periods
-        one_hour_ago = now - timedelta(hours=1)
-        one_day_ago = now - timedelta(days=1)
-        one_week_ago = now - timedelta(weeks=1)
-        one_month_ago = now - timedelta(days=30)
-        
-        # Count clicks for each period
-        last_hour_clicks = db.query(Click).filter(
-            and_(Click.link_id == link_id, Click.clicked_at >= one_hour_ago)
-        ).count()
-        
-        last_day_clicks = db.query(Click).filter(
-            and_(Click.link_id == link_id, Click.clicked_at >= one_day_ago)
-        ).count()
-        
-        last_week_clicks = db.query(Click).filter(
-            and_(Click.link_id == link_id, Click.clicked_at >= one_week_ago)
-        ).count()
-        
-        last_month_clicks = db.query(Click).filter(
-            and_(Click.link_id == link_id, Click.clicked_at >= one_month_ago)
-        ).count()
-        
-        # Get last click time
-        last_click = db.query(Click).filter(Click.link_id == link_id).order_by(desc(Click.clicked_at)).first()
-        last_clicked = last_click.clicked_at if last_click else None
-        
-        return {
-            'last_hour_clicks': last_hour_clicks,
-            'last_day_clicks': last_day_clicks,
-            'last_week_clicks': last_week_clicks,
-            'last_month_clicks': last_month_clicks,
-            'last_clicked': last_clicked
-        }
+    def windowed_stats_query(link_ids, spans: List[timedelta], now: datetime):
+        """Select links with their total clicks, last click and clicks per span, grouped by link.
+
+        Raw clicks and compacted daily aggregates are read as one union, so a
+        single conditional aggregation covers every window. A compacted day
+        counts towards a window when it starts inside it.
+        """
+        raw = select(
+            Click.link_id,
+            Click.clicked_at.label("bucket_at"),
+            Click.clicked_at.label("seen_at"),
+            literal(1).label("clicks"),
+        ).where(Click.link_id.in_(link_ids))
+        compacted = select(
+            ClickDailyAggregate.link_id,
+            ClickDailyAggregate.day,
+            ClickDailyAggregate.last_clicked_at,
+            ClickDailyAggregate.clicks,
+        ).where(ClickDailyAggregate.link_id.in_(link_ids))
+        events = union_all(raw, compacted).subquery()
+
+        pending = select(func.coalesce(func.sum(LinkClickShard.count), 0)).where(
+            LinkClickShard.link_id == Link.id
+        ).scalar_subquery()
+        windows = [
+            func.coalesce(func.sum(case((events.c.bucket_at >= now - span, events.c.clicks), else_=0)), 0)
+            for span in spans
+        ]
+        return select(
+            Link,
+            (Link.click_count + pending).label("click_count"),
+            func.max(events.c.seen_at).label("last_clicked"),
+            *windows,
+        ).outerjoin(events, events.c.link_id == Link.id).where(Link.id.in_(link_ids)).group_by(Link.id)
 
     @staticmethod
-    def get_all_enhanced_stats(db: Session) -> List[dict]:
-        """Get enhanced statistics for all links with time-based data."""
-        links = db.query(Link).order_by(desc(Link.click_count)).all()
-        enhanced_stats = []
-        
-        for link in links:
-            time_stats = LinkService.calculate_time_based_clicks(db, link.id)
-            stats = {
+    def _windowed_stats(db: Session, link_ids, windows: Optional[str], order_by_clicks: bool = False) -> List[dict]:
+        requested = parse_windows(windows)
+        spans = list(dict.fromkeys([*LEGACY_WINDOWS.values(), *requested.values()]))
+        now = utc_naive(datetime.now(timezone.utc))
+        query = LinkService.windowed_stats_query(link_ids, spans, now)
+        if order_by_clicks:
+            query = query.order_by(desc("click_count"), Link.id)
+
+        stats = []
+        for link, click_count, last_clicked, *counts in db.execute(query):
+            clicks_by_span = dict(zip(spans, counts))
+            stats.append({
                 'short_url': link.short_url,
                 'original_url': link.original_url,
-                'click_count': link.click_count,
+                'click_count': click_count,
                 'created_at': link.created_at,
                 'is_active': link.is_active,
-                **time_stats
-            }
-            enhanced_stats.append(stats)
-        
-        return enhanced_stats
+                'last_clicked': last_clicked,
+                **{field: clicks_by_span[span] for field, span in LEGACY_WINDOWS.items()},
+                'windows': {label: clicks_by_span[span] for label, span in requested.items()},
+            })
+        return stats
+
+    @staticmethod
+    def get_enhanced_link_stats(db: Session, short_url: str, windows: Optional[str] = None) -> Optional[dict]:
+        """Get statistics of one link, with clicks for each requested window, in one query.
+
+        Raises ValueError for an invalid window list.
+        """
+        link_ids = select(Link.id).where(Link.short_url == short_url, Link.deleted_at.is_(None))
+        stats = LinkService._windowed_stats(db, link_ids, windows)
+        return stats[0] if stats else None
+
+    @staticmethod
+    def get_all_enhanced_stats(db: Session, windows: Optional[str] = None) -> List[dict]:
+        """Get statistics of all links, most clicked first, in one query whatever the number of links."""
+        link_ids = select(Link.id).where(Link.deleted_at.is_(None))
+        return LinkService._windowed_stats(db, link_ids, windows, order_by_clicks=True)
@@ -0,0 +1,47 @@
+"""Time windows for click statistics.
+
+Windows are written as a count and a unit, e.g. ``15m``, ``1h``, ``24h``,
+``7d`` or ``2w``, and requested as a comma separated list.
+"""
+
+import re
+from datetime import timedelta
+from typing import Dict, Optional
+
+WINDOW_PATTERN = re.compile(r"^(\d{1,6})([mhdw])$")
+WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+MAX_WINDOWS = 10
+MAX_WINDOW_SPAN = timedelta(days=3660)
+
+# Windows reported in the fixed LinkStats fields
+LEGACY_WINDOWS = {
+    "last_hour_clicks": timedelta(hours=1),
+    "last_day_clicks": timedelta(days=1),
+    "last_week_clicks": timedelta(weeks=1),
+    "last_month_clicks": timedelta(days=30),
+}
+DEFAULT_WINDOWS = "1h,24h,7d,30d"
+
+def parse_windows(spec: Optional[str]) -> Dict[str, timedelta]:
+    """Parse a window list such as ``15m,1h,24h,7d`` into spans keyed by label.
+
+    Raises ValueError for unknown units, empty or oversized windows and lists
+    longer than MAX_WINDOWS.
+    """
+    windows = {}
+    for label in (spec or DEFAULT_WINDOWS).split(","):
+        label = label.strip().lower()
+        if not label:
+            continue
+        match = WINDOW_PATTERN.match(label)
+        if not match:
+            raise ValueError(f"Invalid window '{label}', expected a number followed by m, h, d or w")
+        span = timedelta(**{WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+        if not timedelta(0) < span <= MAX_WINDOW_SPAN:
+            raise ValueError(f"Window '{label}' must be between 1m and {MAX_WINDOW_SPAN.days}d")
+        windows[label] = span
+    if not windows:
+        raise ValueError("At least one window is required")
+    if len(windows) > MAX_WINDOWS:
+        raise ValueError(f"At most {MAX_WINDOWS} windows can be requested")
+    return windows
@@ -0,0 +1,48 @@
+"""Validation, normalization and hashing of original URLs, and paths short codes cannot take."""
+
+import hashlib
+from urllib.parse import urlparse, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Single path segments that are application routes rather than short codes
+RESERVED_PATHS = {"/", "/health", "/docs", "/redoc", "/openapi.json", "/favicon.ico"}
+
+def validate_original_url(url: str) -> str:
+    """Check that a URL can be shortened and return it unchanged.
+
+    Raises ValueError when the scheme is not http or https or the host has no
+    dot, the rules applied to links created through the API and imported ones.
+    """
+    if not url.startswith(('http://', 'https://')):
+        raise ValueError('URL must start with http:// or https://')
+    
+    # Validate URL structure
+    parsed = urlparse(url)
+    if not parsed.netloc or '.' not in parsed.netloc:
+        raise ValueError('URL must contain a valid domain')
+    
+    return url
+
+def normalize_url(url: str) -> str:
+    """Normalize the parts of a URL that do not change its destination.
+
+    The scheme and host are lowercased, a default port is dropped and an empty
+    path becomes ``/``. Path, query and fragment are kept as given.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    if "@" in parts.netloc:
+        netloc = f"{parts.netloc.rsplit('@', 1)[0]}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, parts.fragment))
+
+def url_hash(url: str) -> str:
+    """SHA-256 hex digest of the normalized URL, indexed to find links by destination."""
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
@@ -0,0 +1,76 @@
+"""Dictionary encoding of user agent strings."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.database import dialect_insert
+from models.user_agent import UserAgent
+
+MAX_USER_AGENT_LENGTH = 500
+
+def hash_user_agent(value: str) -> str:
+    """Hash a user agent string for the user_agents lookup key."""
+    return hashlib.sha256(value.encode()).hexdigest()
+
+class UserAgentRegistry:
+    """Map user agent strings to user_agents ids, keeping known ids in memory.
+
+    Rows of user_agents never change once written, so cached ids never go stale
+    and the map only needs a size bound.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_id(self, db: Session, user_agent: Optional[str]) -> Optional[int]:
+        """Return the id of a user agent string, inserting it if it is new."""
+        if not user_agent:
+            return None
+        value = user_agent[:MAX_USER_AGENT_LENGTH]
+
+        with self._lock:
+            user_agent_id = self._ids.get(value)
+            if user_agent_id is not None:
+                self._ids.move_to_end(value)
+                return user_agent_id
+
+        ua_hash = hash_user_agent(value)
+        lookup = db.query(UserAgent.id).filter(UserAgent.ua_hash == ua_hash)
+        user_agent_id = lookup.scalar()
+        if user_agent_id is None:
+            # Not cached yet: the new row is only known to be durable once committed
+            self._insert(db, ua_hash, value)
+            return lookup.scalar()
+
+        with self._lock:
+            self._ids[value] = user_agent_id
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+        return user_agent_id
+
+    @staticmethod
+    def _insert(db: Session, ua_hash: str, value: str) -> None:
+        insert = dialect_insert(db)
+        if insert is not None:
+            db.execute(insert(UserAgent).values(ua_hash=ua_hash, value=value).on_conflict_do_nothing())
+            return
+        try:
+            with db.begin_nested():
+                db.add(UserAgent(ua_hash=ua_hash, value=value))
+        except IntegrityError:
+            pass
+
+    def clear(self) -> None:
+        """Forget all known ids."""
+        with self._lock:
+            self._ids.clear()
+
+user_agent_registry = UserAgentRegistry(max_size=settings.USER_AGENT_CACHE_SIZE)
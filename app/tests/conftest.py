@@ -0,0 +1,144 @@
+"""In-process test harness.
+
+The application runs inside the test process against a temporary SQLite
+database, so the tests need neither a running server nor a database server.
+The environment is set before any application module is imported, because
+settings are read at import time.
+"""
+
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+_test_dir = tempfile.mkdtemp(prefix="url-alias-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_dir, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ["DATABASE_READ_URL"] = ""
+os.environ["DB_SCHEMA_MODE"] = "create"
+os.environ["INVALIDATION_BACKEND"] = "inprocess"
+os.environ["CLICK_EXPORT_DIR"] = ""
+# Background jobs are disabled, they would add their queries to the measured requests
+for _interval in ("CLICK_FOLD_INTERVAL_SECONDS", "LINK_PURGE_INTERVAL_SECONDS",
+                  "CLICK_RETENTION_INTERVAL_SECONDS", "IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS",
+                  "LEADERBOARD_REFRESH_INTERVAL_SECONDS"):
+    os.environ[_interval] = "0"
+# Budget tests send bursts from one client, rate limiting and load shedding are tested on their own
+os.environ["REDIRECT_RATE_LIMIT_PER_SECOND"] = "0"
+os.environ["CREATE_RATE_LIMIT_PER_SECOND"] = "0"
+os.environ["LOAD_SHEDDING_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+from core.security import get_password_hash
+from db.database import SessionLocal, engine
+from main import create_app
+from models.click import Click
+from models.link import Link
+from models.user import User
+
+BASE_URL = "http://testserver"
+
+class QueryCounter:
+    """Statements sent to the database while counting."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def reads(self) -> List[str]:
+        return [s for s in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+    @property
+    def writes(self) -> List[str]:
+        return [s for s in self.statements if not s.lstrip().upper().startswith("SELECT")]
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database_dir():
+    """Remove the temporary database directory once the session is over."""
+    yield _test_dir
+    engine.dispose()
+    shutil.rmtree(_test_dir, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def app():
+    """Application instance for the test session."""
+    return create_app()
+
+@pytest.fixture(scope="session")
+def client(app):
+    """HTTP client calling the application in process, with its lifespan run once."""
+    with TestClient(app, base_url=BASE_URL) as test_client:
+        yield test_client
+
+@pytest.fixture
+def count_queries():
+    """Context manager counting the statements executed inside it."""
+    @contextmanager
+    def counting():
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter.record)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter.record)
+    return counting
+
+@pytest.fixture
+def timed():
+    """Median duration in seconds of calling a function a number of times."""
+    def median_seconds(func, repeat: int = 20) -> float:
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - started)
+        return sorted(durations)[len(durations) // 2]
+    return median_seconds
+
+@pytest.fixture
+def seed_links(client):
+    """Insert links with clicks spread over the last 60 days directly into the database."""
+    def seed(username: str, links: int, clicks_per_link: int) -> List[str]:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        prefix = "".join(random.choices(string.ascii_lowercase, k=6))
+        codes = [f"{prefix}{i}" for i in range(links)]
+        db = SessionLocal()
+        try:
+            if db.query(User).filter(User.username == username).first() is None:
+                db.add(User(username=username, hashed_password=get_password_hash("seed")))
+            db.execute(insert(Link), [{
+                "short_url": code,
+                "original_url": f"https://seed.example.com/{code}",
+                "created_by": username,
+                "created_at": now,
+                "expires_at": now + timedelta(days=30),
+                "click_count": clicks_per_link,
+            } for code in codes])
+            link_ids = db.query(Link.id).filter(Link.short_url.in_(codes)).all()
+            db.execute(insert(Click), [{
+                "link_id": link_id,
+                "clicked_at": now - timedelta(minutes=random.randrange(60 * 24 * 60)),
+            } for (link_id,) in link_ids for _ in range(clicks_per_link)])
+            db.commit()
+        finally:
+            db.close()
+        return codes
+    return seed
@@ -0,0 +1,132 @@
+"""Query and latency budgets of the hot endpoints.
+
+Each test seeds data, warms caches with one request and then measures the
+next ones, so N+1 query patterns and accidental cache misses fail the suite.
+Latency depends on the machine, so those budgets only run when
+``TEST_LATENCY_BUDGETS=true`` is set.
+"""
+
+import base64
+import os
+import uuid
+
+import pytest
+
+from conftest import BASE_URL
+
+# Median latency limits in seconds
+REDIRECT_LATENCY_BUDGET = 0.05
+STATS_LATENCY_BUDGET = 0.5
+latency_budget = pytest.mark.skipif(
+    os.getenv("TEST_LATENCY_BUDGETS", "false").lower() != "true",
+    reason="latency budgets run with TEST_LATENCY_BUDGETS=true",
+)
+
+
+def basic_auth(username: str, password: str) -> dict:
+    encoded = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return {"Authorization": f"Basic {encoded}"}
+
+
+def create_user(client) -> dict:
+    username = f"budget_{uuid.uuid4().hex[:8]}"
+    response = client.post(f"{BASE_URL}/api/users/", json={"username": username, "password": "budget"})
+    assert response.status_code == 201
+    return basic_auth(username, "budget")
+
+
+def create_cached_link(client) -> str:
+    headers = create_user(client)
+    response = client.post(f"{BASE_URL}/api/links/", json={"original_url": "https://budget.example.com"},
+                           headers=headers)
+    short_url = response.json()["short_url"]
+    # Fills the redirect cache; user agent ids are cached once their row is known to be committed
+    for _ in range(2):
+        assert client.get(f"{BASE_URL}/{short_url}", follow_redirects=False).status_code == 301
+    return short_url
+
+
+def test_redirect_cache_hit_budget(client, count_queries):
+    """A cached redirect reads nothing and only records the click."""
+    print("\nTesting redirect budget...")
+
+    short_url = create_cached_link(client)
+    with count_queries() as queries:
+        assert client.get(f"{BASE_URL}/{short_url}", follow_redirects=False).status_code == 301
+    assert queries.reads == []
+    # The click row and its counter shard
+    assert len(queries.writes) <= 2, queries.statements
+    print(f"Redirect budget holds ({queries.count} statements)")
+
+
+@latency_budget
+def test_redirect_latency_budget(client, timed):
+    """A cached redirect stays under the redirect latency budget."""
+    print("\nTesting redirect latency...")
+
+    short_url = create_cached_link(client)
+    latency = timed(lambda: client.get(f"{BASE_URL}/{short_url}", follow_redirects=False))
+    assert latency < REDIRECT_LATENCY_BUDGET
+    print(f"Redirect latency holds (median {latency * 1000:.1f} ms)")
+
+
+def test_stats_query_count_independent_of_links(client, count_queries, seed_links):
+    """All-link statistics use the same number of queries for 10 and 500 links."""
+    print("\nTesting statistics budget...")
+
+    seed_links("budget_stats", links=10, clicks_per_link=5)
+    with count_queries() as few:
+        small = client.get(f"{BASE_URL}/api/stats/")
+    assert small.status_code == 200
+
+    seed_links("budget_stats", links=490, clicks_per_link=10)
+    with count_queries() as many:
+        large = client.get(f"{BASE_URL}/api/stats/")
+    assert large.status_code == 200
+    assert len(large.json()) >= len(small.json()) + 490
+    assert many.count == few.count <= 1, many.statements
+    print(f"Statistics budget holds ({many.count} statements)")
+
+
+@latency_budget
+def test_stats_latency_budget(client, seed_links, timed):
+    """All-link statistics over 500 links stay under the statistics latency budget."""
+    print("\nTesting statistics latency...")
+
+    seed_links("budget_stats_latency", links=500, clicks_per_link=10)
+    latency = timed(lambda: client.get(f"{BASE_URL}/api/stats/"), repeat=5)
+    assert latency < STATS_LATENCY_BUDGET
+    print(f"Statistics latency holds (median {latency * 1000:.1f} ms)")
+
+
+def test_link_stats_budget(client, count_queries, seed_links):
+    """Single-link statistics with custom windows are one query."""
+    print("\nTesting link statistics budget...")
+
+    short_url = seed_links("budget_link_stats", links=1, clicks_per_link=200)[0]
+    with count_queries() as queries:
+        response = client.get(f"{BASE_URL}/api/stats/{short_url}?windows=15m,1h,24h,7d,30d,9w")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["windows"]["9w"] == 200
+    assert stats["last_month_clicks"] == stats["windows"]["30d"]
+    assert queries.count == 1, queries.statements
+    print("Link statistics budget holds")
+
+
+def test_link_listing_budget(client, count_queries, seed_links):
+    """Listing a page of links is a count and a page query once credentials are cached."""
+    print("\nTesting link listing budget...")
+
+    headers = create_user(client)
+    username = base64.b64decode(headers["Authorization"].split()[1]).decode().split(":")[0]
+    seed_links(username, links=200, clicks_per_link=1)
+    # Fills the authentication cache
+    assert client.get(f"{BASE_URL}/api/links/", headers=headers).status_code == 200
+
+    with count_queries() as queries:
+        response = client.get(f"{BASE_URL}/api/links/?page=3&page_size=50", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == 200
+    assert queries.count <= 2, queries.statements
+    print("Link listing budget holds")
@@ -0,0 +1,57 @@
+"""Sharded click counters."""
+
+from datetime import datetime, timedelta, timezone
+
+from core.config import settings
+from db.database import SessionLocal
+from models.click_counter import LinkClickShard
+from models.link import Link
+from services.click_counter import ClickCounterService, fold_pending_clicks
+
+
+def test_fold_run_is_bounded_under_traffic(client, monkeypatch):
+    """Test that one fold run stops after the shards pending at its start while clicks keep arriving."""
+    print("\nTesting bounded click folding...")
+
+    monkeypatch.setattr(settings, "CLICK_FOLD_BATCH_SIZE", 2)
+    fold_pending_clicks()
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        links = [Link(short_url=f"foldcap{i}", original_url="https://fold.example.com",
+                      expires_at=now + timedelta(days=1)) for i in range(20)]
+        db.add_all(links)
+        db.flush()
+        db.add_all([LinkClickShard(link_id=link.id, shard=0, count=3) for link in links[:5]])
+        db.commit()
+        link_ids = [link.id for link in links]
+    finally:
+        db.close()
+
+    fold = ClickCounterService.fold
+    arriving = iter(link_ids[5:])
+    batches = []
+
+    def fold_with_traffic(db, batch_size):
+        # Every batch is followed by a click on a link without pending shards
+        result = fold(db, batch_size)
+        batches.append(result)
+        ClickCounterService.increment(db, next(arriving))
+        db.commit()
+        return result
+
+    monkeypatch.setattr(ClickCounterService, "fold", staticmethod(fold_with_traffic))
+    folded = fold_pending_clicks()
+    # 5 shards pending at the start: 3 batches of 2, the last one takes the first arrival along
+    assert len(batches) == 3
+    assert folded == 16
+
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(Link.id, Link.click_count).filter(Link.id.in_(link_ids[:5])).all())
+        assert all(count == 3 for count in counts.values())
+        # Later arrivals wait for the next run
+        assert [ClickCounterService.get_pending_count(db, link_id) for link_id in link_ids[5:8]] == [0, 1, 1]
+    finally:
+        db.close()
+    print("Bounded click folding works")
@@ -0,0 +1,114 @@
+"""Parquet click export and the archive reading it."""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from db.database import Base
+from models.click import Click
+from models.link import Link
+from services.click_archive import ClickArchive
+from services.click_export import ClickExporter
+
+
+@pytest.fixture
+def export_db(tmp_path):
+    """Session on a separate SQLite database holding one link and five old clicks over two days."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = Session(engine)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    link = Link(short_url="exported", original_url="https://export.example.com", created_by="exporter",
+                expires_at=now + timedelta(days=1))
+    db.add(link)
+    db.flush()
+    db.add_all([Click(link_id=link.id, clicked_at=datetime(2025, 3, 1 + i // 3, 12, i), ip="192.0.2.1")
+                for i in range(5)])
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def part_files(directory):
+    return sorted(name for _, _, names in os.walk(directory) for name in names if name.startswith("part-"))
+
+
+def test_export_full_batches(export_db, tmp_path):
+    """Test that every batch is exported, partitioned by day, and readable through the archive."""
+    print("\nTesting click export...")
+
+    directory = str(tmp_path / "clicks")
+    exporter = ClickExporter(directory, batch_size=2)
+    assert exporter.export(export_db) == 5
+    assert exporter.read_watermark() == 5
+    # The batch spanning midnight is split into one part per day
+    assert part_files(directory) == [
+        "part-000000000001-000000000002.parquet",
+        "part-000000000003-000000000003.parquet",
+        "part-000000000004-000000000004.parquet",
+        "part-000000000005-000000000005.parquet",
+    ]
+    assert exporter.export(export_db) == 0
+
+    archive = ClickArchive(directory)
+    by_link = archive.clicks_by_link()
+    assert [(row["short_url"], row["clicks"]) for row in by_link] == [("exported", 5)]
+    assert [(row["day"], row["clicks"]) for row in archive.clicks_by_day()] == [
+        (date(2025, 3, 1), 3), (date(2025, 3, 2), 2),
+    ]
+    assert archive.clicks_by_day(start=date(2025, 3, 2), short_url="exported")[0]["clicks"] == 2
+    assert archive.read(columns=["ip"])["ip"].to_pylist() == ["192.0.2.1"] * 5
+    print("Click export works")
+
+
+def test_export_stops_at_safety_lag(export_db, tmp_path):
+    """Test that recent clicks are left for the next run and the exported ones are still counted."""
+    print("\nTesting click export safety lag...")
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    export_db.add_all([Click(link_id=1, clicked_at=now), Click(link_id=1, clicked_at=now)])
+    export_db.commit()
+
+    exporter = ClickExporter(str(tmp_path / "clicks"), batch_size=10, safety_lag_seconds=60)
+    assert exporter.export(export_db) == 5
+    assert exporter.read_watermark() == 5
+
+    lagless = ClickExporter(str(tmp_path / "clicks"), batch_size=10, safety_lag_seconds=0)
+    assert lagless.export(export_db) == 2
+    assert lagless.read_watermark() == 7
+    print("Click export safety lag works")
+
+
+def test_export_resumes_after_unacknowledged_part(export_db, tmp_path, monkeypatch):
+    """Test that parts written after the last saved watermark are replaced, not duplicated."""
+    print("\nTesting click export resume...")
+
+    directory = str(tmp_path / "clicks")
+    exporter = ClickExporter(directory, batch_size=3)
+    write_watermark = exporter._write_watermark
+    calls = []
+
+    def crash_on_second_batch(last_click_id):
+        calls.append(last_click_id)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        write_watermark(last_click_id)
+
+    monkeypatch.setattr(exporter, "_write_watermark", crash_on_second_batch)
+    with pytest.raises(OSError):
+        exporter.export(export_db)
+    assert exporter.read_watermark() == 3
+    assert len(part_files(directory)) == 2
+
+    monkeypatch.undo()
+    assert ClickExporter(directory, batch_size=3).export(export_db) == 2
+    assert part_files(directory) == [
+        "part-000000000001-000000000003.parquet",
+        "part-000000000004-000000000005.parquet",
+    ]
+    assert ClickArchive(directory).clicks_by_link()[0]["clicks"] == 5
+    print("Click export resume works")
@@ -0,0 +1,93 @@
+"""Compaction of old clicks into daily aggregates."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import services.click_retention as click_retention
+from core.config import settings
+from db.database import Base
+from models.click import Click
+from models.click_aggregate import ClickDailyAggregate
+from models.link import Link
+from services.click_export import ClickExporter
+from services.click_retention import ClickRetentionService, compact_old_clicks, retention_cutoff
+from services.link_service import LinkService
+
+WINDOWS = "1h,7d,97d,365d"
+
+
+@pytest.fixture
+def retention_db(tmp_path):
+    """Separate SQLite database with one link clicked on two days past retention and twice recently."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    first_day = (now - timedelta(days=100)).replace(hour=0, minute=0, second=0, microsecond=0)
+    second_day = first_day + timedelta(days=5)
+    clicked_at = [
+        first_day + timedelta(hours=10), first_day + timedelta(hours=11),
+        second_day + timedelta(hours=9), first_day + timedelta(hours=12), second_day + timedelta(hours=8),
+        now - timedelta(days=2), now - timedelta(minutes=30),
+    ]
+    with Session(engine) as db:
+        link = Link(short_url="retained", original_url="https://retention.example.com",
+                    click_count=len(clicked_at), expires_at=now + timedelta(days=1))
+        db.add(link)
+        db.flush()
+        db.add_all([Click(link_id=link.id, clicked_at=at) for at in clicked_at])
+        db.commit()
+    yield engine, first_day, second_day
+    engine.dispose()
+
+
+def aggregates(db: Session) -> dict:
+    return {row.day: (row.clicks, row.last_clicked_at)
+            for row in db.query(ClickDailyAggregate).order_by(ClickDailyAggregate.day)}
+
+
+def test_compaction_keeps_statistics(retention_db, tmp_path, monkeypatch):
+    """Test that compaction folds old clicks into upserted daily rows, bounded by the export watermark."""
+    print("\nTesting click compaction...")
+
+    engine, first_day, second_day = retention_db
+    cutoff = retention_cutoff()
+    assert second_day < cutoff
+    with Session(engine) as db:
+        before = LinkService.get_enhanced_link_stats(db, "retained", WINDOWS)
+        click_ids = [click_id for (click_id,) in db.query(Click.id).order_by(Click.id)]
+
+        assert ClickRetentionService.compact_batch(db, cutoff, batch_size=10, max_click_id=click_ids[1]) == 2
+        assert ClickRetentionService.compact_batch(db, cutoff, batch_size=10, max_click_id=click_ids[1]) == 0
+        assert aggregates(db) == {first_day: (2, first_day + timedelta(hours=11))}
+
+    # The background job stops at the last exported click
+    monkeypatch.setattr(click_retention, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "CLICK_RETENTION_BATCH_SIZE", 2)
+    (tmp_path / "export").mkdir()
+    monkeypatch.setattr(settings, "CLICK_EXPORT_DIR", str(tmp_path / "export"))
+    ClickExporter(settings.CLICK_EXPORT_DIR)._write_watermark(click_ids[3])
+    assert compact_old_clicks() == 2
+    with Session(engine) as db:
+        assert aggregates(db) == {
+            first_day: (3, first_day + timedelta(hours=12)),
+            second_day: (1, second_day + timedelta(hours=9)),
+        }
+
+    monkeypatch.setattr(settings, "CLICK_EXPORT_DIR", "")
+    assert compact_old_clicks() == 1
+    assert compact_old_clicks() == 0
+    with Session(engine) as db:
+        # The later click keeps last_clicked_at when an earlier one is added to its day
+        assert aggregates(db) == {
+            first_day: (3, first_day + timedelta(hours=12)),
+            second_day: (2, second_day + timedelta(hours=9)),
+        }
+        assert db.query(Click).count() == 2
+        after = LinkService.get_enhanced_link_stats(db, "retained", WINDOWS)
+    assert after == before
+    assert after["click_count"] == 7
+    assert after["windows"] == {"1h": 1, "7d": 2, "97d": 4, "365d": 7}
+    print("Click compaction works")
@@ -1,15 +1,18 @@
 
 #!/usr/bin/env python3
-"""Testing all main endpoints with pytest fixtures."""
+"""Testing all main endpoints with pytest fixtures.
+
+The client fixture from conftest.py runs the application in process.
+"""
 
-import httpx
 import base64
+import uuid
 from typing import Dict
 import pytest
 
 
 # Configuration
-BASE_URL = "http://0.0.0.0:8000"
+BASE_URL = "http://testserver"
 TEST_USER = "test_user"
 TEST_PASSWORD = "test_pass"
 
@@ -22,12 +25,6 @@ def auth_headers() -> Dict[str, str]:
     return {"Authorization": f"Basic {encoded}"}
 
 
-@pytest.fixture
-def client():
-    """HTTP client fixture."""
-    return httpx.Client()
-
-
 @pytest.fixture
 def test_user(client):
     """Create test user and return credentials."""
@@ -105,6 +102,32 @@ def test_link_creation(client, auth_headers, test_user):
     print("Link creation works")
 
 
+def test_link_creation_reuse_and_idempotency(client, auth_headers, test_user):
+    """Test reuse of an existing link and Idempotency-Key retries."""
+    print("\nTesting idempotent link creation...")
+    
+    url = f"https://www.example.com/reuse/{uuid.uuid4().hex}"
+    first = client.post(f"{BASE_URL}/api/links/", json={"original_url": url}, headers=auth_headers)
+    assert first.status_code == 201
+    reused = client.post(f"{BASE_URL}/api/links/",
+                         json={"original_url": url.replace("www.example.com", "WWW.Example.com:443"), "reuse_existing": True},
+                         headers=auth_headers)
+    assert reused.status_code == 200
+    assert reused.json()["short_url"] == first.json()["short_url"]
+    
+    headers = {**auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    link_data = {"original_url": f"https://www.example.com/retry/{uuid.uuid4().hex}"}
+    created = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers)
+    retried = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers)
+    assert created.status_code == retried.status_code == 201
+    assert retried.json()["short_url"] == created.json()["short_url"]
+    assert retried.headers["idempotent-replayed"] == "true"
+    
+    conflicting = client.post(f"{BASE_URL}/api/links/", json={"original_url": url}, headers=headers)
+    assert conflicting.status_code == 422
+    print("Idempotent link creation works")
+
+
 def test_link_listing(client, auth_headers, test_link):
     """Test link listing."""
     print("\nTesting link listing...")
@@ -143,6 +166,58 @@ def test_link_update(client, auth_headers, test_link):
     print("Link update works")
 
 
+def test_bulk_link_update(client, auth_headers, test_link):
+    """Test bulk update of links by short URLs and by filter."""
+    print("\nTesting bulk link update...")
+    
+    short_url = test_link["short_url"]
+    update_data = {"short_urls": [short_url, "missing-code"], "is_active": False}
+    response = client.patch(f"{BASE_URL}/api/links/", json=update_data, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["updated"] == 1
+    assert data["not_found"] == ["missing-code"]
+    
+    response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+    assert response.status_code == 404
+    
+    update_data = {"filter": {"url_prefix": "https://www.example.com"}, "is_active": True}
+    response = client.patch(f"{BASE_URL}/api/links/", json=update_data, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["updated"] >= 1
+    
+    response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+    assert response.status_code == 301
+    
+    # Either short_urls or filter must be given
+    response = client.patch(f"{BASE_URL}/api/links/", json={"is_active": False}, headers=auth_headers)
+    assert response.status_code == 422
+    
+    # An empty filter would select every link
+    update_data = {"filter": {}, "is_active": False}
+    response = client.patch(f"{BASE_URL}/api/links/", json=update_data, headers=auth_headers)
+    assert response.status_code == 422
+    print("Bulk link update works")
+
+
+def test_link_delete(client, auth_headers, test_link):
+    """Test that a deleted link disappears immediately."""
+    print("\nTesting link deletion...")
+    
+    short_url = test_link["short_url"]
+    response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+    assert response.status_code == 301
+    
+    response = client.delete(f"{BASE_URL}/api/links/{short_url}", headers=auth_headers)
+    assert response.status_code == 204
+    
+    response = client.get(f"{BASE_URL}/api/links/{short_url}", headers=auth_headers)
+    assert response.status_code == 404
+    response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+    assert response.status_code == 404
+    print("Link deletion works")
+
+
 def test_stats_endpoints(client, auth_headers, test_user):
     """Test statistics endpoints."""
     print("\nTesting stats endpoints...")
@@ -154,6 +229,48 @@ def test_stats_endpoints(client, auth_headers, test_user):
     print("Get all stats works")
 
 
+def test_stats_count_redirects(client, auth_headers, test_link):
+    """Test that redirects are reflected in statistics before and after folding."""
+    print("\nTesting click counting...")
+    
+    short_url = test_link["short_url"]
+    for _ in range(3):
+        response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+        assert response.status_code == 301
+    
+    response = client.get(f"{BASE_URL}/api/stats/", headers=auth_headers)
+    assert response.status_code == 200
+    stats = {item["short_url"]: item for item in response.json()}
+    assert stats[short_url]["click_count"] == 3
+    assert stats[short_url]["last_hour_clicks"] == 3
+    print("Click counting works")
+
+
+def test_link_stats_windows(client, auth_headers, test_link):
+    """Test single-link statistics with custom windows."""
+    print("\nTesting link statistics windows...")
+
+    short_url = test_link["short_url"]
+    for _ in range(2):
+        response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+        assert response.status_code == 301
+
+    response = client.get(f"{BASE_URL}/api/stats/{short_url}?windows=15m,1h,7d", headers=auth_headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["click_count"] == 2
+    assert stats["last_day_clicks"] == 2
+    assert stats["windows"] == {"15m": 2, "1h": 2, "7d": 2}
+    assert stats["last_clicked"] is not None
+
+    response = client.get(f"{BASE_URL}/api/stats/{short_url}?windows=5y", headers=auth_headers)
+    assert response.status_code == 400
+
+    response = client.get(f"{BASE_URL}/api/stats/nonexistent", headers=auth_headers)
+    assert response.status_code == 404
+    print("Link statistics windows work")
+
+
 def test_redirect_endpoint(client):
     """Test redirect functionality."""
     print("\nTesting redirect endpoint...")
@@ -165,6 +282,18 @@ def test_redirect_endpoint(client):
     print("Redirect endpoint works (correctly returns 404 for non-existent link)")
 
 
+def test_redirect_to_created_link(client, test_link):
+    """Test redirect to an existing link, served twice to exercise the redirect cache."""
+    print("\nTesting redirect to created link...")
+    
+    short_url = test_link["short_url"]
+    for _ in range(2):
+        response = client.get(f"{BASE_URL}/{short_url}", follow_redirects=False)
+        assert response.status_code == 301
+        assert response.headers["location"] == test_link["original_url"]
+    print("Redirect to created link works")
+
+
 def test_authentication_unauthorized(client):
     """Test unauthorized access to protected endpoints."""
     print("\nTesting authentication...")
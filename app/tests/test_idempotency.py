@@ -0,0 +1,78 @@
+"""Idempotent link creation when requests fail or overlap."""
+
+import uuid
+
+from conftest import BASE_URL
+from core.config import settings
+from db.database import SessionLocal
+from models.link import Link
+from services.idempotency import IdempotencyService
+from services.link_service import LinkService
+
+
+def create_user(client) -> tuple:
+    username = f"idem_{uuid.uuid4().hex[:8]}"
+    assert client.post(f"{BASE_URL}/api/users/", json={"username": username, "password": "idem"}).status_code == 201
+    return username, "idem"
+
+
+def links_to(url: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Link).filter(Link.original_url == url).count()
+    finally:
+        db.close()
+
+
+def test_failed_completion_creates_nothing(client, monkeypatch):
+    """Test that a link is not kept when its response cannot be stored, and that a retry creates it once."""
+    print("\nTesting failed idempotent completion...")
+
+    auth = create_user(client)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    link_data = {"original_url": f"https://idempotency.example.com/{uuid.uuid4().hex}"}
+    complete = IdempotencyService.complete
+
+    def failing_complete(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(IdempotencyService, "complete", staticmethod(failing_complete))
+    response = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers, auth=auth)
+    assert response.status_code == 500
+    assert links_to(link_data["original_url"]) == 0
+
+    # The key was released with the link, so the retry runs again instead of getting 409
+    monkeypatch.setattr(IdempotencyService, "complete", staticmethod(complete))
+    response = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers, auth=auth)
+    assert response.status_code == 201
+    assert links_to(link_data["original_url"]) == 1
+    print("Failed idempotent completion works")
+
+
+def test_slow_request_yields_to_takeover(client, monkeypatch):
+    """Test that a request outliving its claim replays the retry that took over instead of adding a link."""
+    print("\nTesting idempotency takeover...")
+
+    auth = create_user(client)
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    link_data = {"original_url": f"https://idempotency.example.com/{uuid.uuid4().hex}"}
+    # Every claim in progress is stale at once
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 0)
+    create_link = LinkService.create_link
+    retried = []
+
+    def slow_create_link(db, data, username):
+        if not retried:
+            # The client gives up waiting and retries while this request is still running
+            retried.append(None)
+            retried[0] = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers, auth=auth)
+        return create_link(db, data, username)
+
+    monkeypatch.setattr(LinkService, "create_link", staticmethod(slow_create_link))
+    first = client.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers, auth=auth)
+    assert retried[0].status_code == 201
+    assert first.status_code == 201
+    assert first.headers["idempotent-replayed"] == "true"
+    assert first.json()["short_url"] == retried[0].json()["short_url"]
+    assert links_to(link_data["original_url"]) == 1
+    print("Idempotency takeover works")
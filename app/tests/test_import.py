@@ -0,0 +1,144 @@
+"""Streaming bulk import."""
+
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import DataError
+
+from db.database import SessionLocal
+from models.link import Link
+from models.user import User
+from services.bulk_import import BulkImporter, copy_csv, import_file, read_checkpoint
+from services.urls import url_hash
+
+
+def run_import(tmp_path, kind, path, input_format, batch_size=3):
+    db = SessionLocal()
+    try:
+        return import_file(db, BulkImporter(kind, batch_size=batch_size), str(path), input_format,
+                           str(tmp_path / f"{path.name}.checkpoint"), str(tmp_path / f"{path.name}.rejects"))
+    finally:
+        db.close()
+
+
+def test_import_links_csv(client, tmp_path):
+    """Test that links keep given codes, get derived ones otherwise, and that a rerun adds nothing."""
+    print("\nTesting link import...")
+
+    path = tmp_path / "links.csv"
+    path.write_text(
+        "short_url,original_url,created_by,click_count,expires_at\n"
+        "imp-keep1,https://import.example.com/1,importer,7,2099-01-01T00:00:00\n"
+        ",https://import.example.com/2,importer,,\n"
+        ",https://import.example.com/3,importer,,\n"
+        "imp-bad,ftp://import.example.com/4,importer,,\n"
+        "api,https://import.example.com/5,importer,,\n"
+        "imp-keep1,https://import.example.com/other,importer,,\n"
+        "broken,line\n"
+        "imp-keep2,https://import.example.com/6,,,\n"
+        f"imp-owner,https://import.example.com/7,{'x' * 51},,\n"
+        "imp-count,https://import.example.com/8,importer,2147483648,\n"
+    )
+    progress = run_import(tmp_path, "links", path, "csv")
+    assert (progress.rows, progress.inserted, progress.existing, progress.rejected) == (10, 4, 0, 6)
+    assert progress.offset == path.stat().st_size
+    with open(tmp_path / "links.csv.rejects") as f:
+        errors = [json.loads(line)["error"] for line in f]
+    assert len(errors) == 6 and any("taken" in error for error in errors)
+    assert any("created_by" in error for error in errors) and any("click_count" in error for error in errors)
+
+    db = SessionLocal()
+    try:
+        links = db.query(Link).filter(Link.original_url.like("https://import.example.com/%")).all()
+        assert len(links) == 4
+        kept = next(link for link in links if link.short_url == "imp-keep1")
+        assert kept.click_count == 7 and kept.created_by == "importer"
+        assert kept.url_hash == url_hash("https://import.example.com/1")
+        assert kept.expires_at.year == 2099
+    finally:
+        db.close()
+
+    # Without its checkpoint the same file is recognized row by row
+    (tmp_path / "links.csv.checkpoint").unlink()
+    progress = run_import(tmp_path, "links", path, "csv", batch_size=100)
+    assert (progress.inserted, progress.existing) == (0, 4)
+    print("Link import works")
+
+
+def test_import_resumes_from_checkpoint(client, tmp_path):
+    """Test that an import continues after the checkpointed offset."""
+    print("\nTesting import resume...")
+
+    path = tmp_path / "users.jsonl"
+    lines = [json.dumps({"username": f"imported_{i}", "hashed_password": "$2b$12$" + "x" * 53}) for i in range(5)]
+    path.write_text("\n".join(lines[:3]) + "\n")
+    progress = run_import(tmp_path, "users", path, "jsonl", batch_size=2)
+    assert progress.inserted == 3
+
+    path.write_text("\n".join(lines + ['{"username": ""}', "[1]"]) + "\n")
+    progress = run_import(tmp_path, "users", path, "jsonl", batch_size=2)
+    assert (progress.rows, progress.inserted, progress.existing, progress.rejected) == (7, 5, 0, 2)
+    assert read_checkpoint(str(tmp_path / "users.jsonl.checkpoint")).offset == path.stat().st_size
+
+    db = SessionLocal()
+    try:
+        assert db.query(User).filter(User.username.like("imported_%")).count() == 5
+    finally:
+        db.close()
+    print("Import resume works")
+
+
+def test_copy_csv_values():
+    """Test that rows sent to COPY keep NULLs apart from values and use Postgres literals."""
+    print("\nTesting COPY CSV rows...")
+
+    buffer = copy_csv([
+        {"short_url": "a,b", "created_by": None, "is_active": True, "click_count": 0,
+         "created_at": datetime(2025, 1, 2, 3, 4, 5)},
+        {"short_url": 'say "hi"', "created_by": "importer", "is_active": False, "click_count": 12,
+         "created_at": datetime(2025, 1, 2, 3, 4, 5, 600000)},
+    ])
+    lines = buffer.read().splitlines()
+    # An unquoted empty field is NULL, a quoted one would be an empty string
+    assert lines[0] == '"a,b",,true,0,2025-01-02 03:04:05'
+    assert list(csv.reader(lines[1:])) == [['say "hi"', "importer", "false", "12", "2025-01-02 03:04:05.600000"]]
+    print("COPY CSV rows work")
+
+
+def test_refused_rows_are_rejected(client, tmp_path, monkeypatch):
+    """Test that rows failing in the database go to the rejects file while the rest of their batch is kept."""
+    print("\nTesting refused import rows...")
+
+    hashed_password = "$2b$12$" + "x" * 53
+    path = tmp_path / "refused.jsonl"
+    path.write_text("\n".join(json.dumps(record) for record in [
+        {"username": "refused_ok1", "hashed_password": hashed_password},
+        {"username": "refused_long", "hashed_password": hashed_password + "x" * 200},
+        {"username": "refused_bad", "hashed_password": hashed_password},
+        {"username": "refused_ok2", "hashed_password": hashed_password},
+    ]) + "\n")
+    insert = BulkImporter._insert
+
+    def refusing_insert(self, db, values):
+        # Stands in for a value the database cannot store, like an oversized string on Postgres
+        if any(row["username"] == "refused_bad" for row in values):
+            raise DataError("INSERT INTO users", {}, Exception("value too long"))
+        return insert(self, db, values)
+
+    monkeypatch.setattr(BulkImporter, "_insert", refusing_insert)
+    progress = run_import(tmp_path, "users", path, "jsonl", batch_size=10)
+    assert (progress.rows, progress.inserted, progress.rejected) == (4, 2, 2)
+    assert progress.offset == path.stat().st_size
+    with open(tmp_path / "refused.jsonl.rejects") as f:
+        errors = {json.loads(line)["offset"]: json.loads(line)["error"] for line in f}
+    assert sorted(errors.values()) == ["database error: value too long", "hashed_password is longer than 200 characters"]
+
+    db = SessionLocal()
+    try:
+        assert sorted(u for (u,) in db.query(User.username).filter(User.username.like("refused_%"))) == [
+            "refused_ok1", "refused_ok2",
+        ]
+    finally:
+        db.close()
+    print("Refused import rows work")
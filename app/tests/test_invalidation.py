@@ -0,0 +1,81 @@
+"""Cache invalidation bus."""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.security import AuthCache, auth_cache
+from models.user import User
+from services.cache import CachedLink, RedirectCache, redirect_cache
+from services.invalidation import (
+    LINK_EVENT,
+    USER_EVENT,
+    InProcessBackend,
+    InvalidationBus,
+    UnixSocketBackend,
+    invalidation_bus,
+)
+
+
+def cached_link(short_url: str) -> CachedLink:
+    return CachedLink(id=1, short_url=short_url, original_url="https://bus.example.com", is_active=True,
+                      expires_at=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1))
+
+
+def wait_until(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_inprocess_bus_drops_cached_entries(client):
+    """Test that events published in process drop the redirect and auth cache entries at once."""
+    print("\nTesting in-process invalidation...")
+
+    assert isinstance(invalidation_bus.backend, InProcessBackend)
+    redirect_cache.set(cached_link("buslocal"))
+    auth_cache.set(User(username="bus_local", hashed_password="hash", is_active=True), "secret")
+    assert redirect_cache.get("buslocal") is not None
+    assert auth_cache.get("bus_local", "secret") is not None
+
+    invalidation_bus.publish_link("buslocal")
+    invalidation_bus.publish_user("bus_local")
+    assert redirect_cache.get("buslocal") is None
+    assert auth_cache.get("bus_local", "secret") is None
+
+    received = []
+    invalidation_bus.subscribe(LINK_EVENT, received.append)
+    invalidation_bus.publish_link("busfirst")
+    invalidation_bus.unsubscribe(LINK_EVENT, received.append)
+    invalidation_bus.publish_link("bussecond")
+    assert received == ["busfirst"]
+    print("In-process invalidation works")
+
+
+def test_unix_socket_bus_reaches_other_workers(tmp_path):
+    """Test that an event published by one worker drops the entries cached by another."""
+    print("\nTesting Unix socket invalidation...")
+
+    publisher = InvalidationBus(UnixSocketBackend(str(tmp_path)))
+    receiver = InvalidationBus(UnixSocketBackend(str(tmp_path)))
+    links = RedirectCache(max_size=10, ttl_seconds=60)
+    users = AuthCache(max_size=10, ttl_seconds=60)
+    receiver.subscribe(LINK_EVENT, links.invalidate)
+    receiver.subscribe(USER_EVENT, users.invalidate)
+    links.set(cached_link("busremote"))
+    users.set(User(username="bus_remote", hashed_password="hash", is_active=True), "secret")
+
+    publisher.start()
+    receiver.start()
+    try:
+        publisher.publish_link("busremote")
+        publisher.publish_user("bus_remote")
+        assert wait_until(lambda: links.get("busremote") is None)
+        assert wait_until(lambda: users.get("bus_remote", "secret") is None)
+    finally:
+        publisher.stop()
+        receiver.stop()
+    assert list(tmp_path.iterdir()) == []
+    print("Unix socket invalidation works")
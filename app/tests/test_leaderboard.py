@@ -0,0 +1,149 @@
+"""Materialized statistics leaderboard."""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from conftest import BASE_URL
+from core.config import settings
+from db.database import Base, SessionLocal
+from models.click import Click
+from models.link import Link
+from services.invalidation import LINK_EVENT, invalidation_bus
+from services.leaderboard import Leaderboard, leaderboard
+from services.link_service import LinkService
+
+
+def without_as_of(stats):
+    return [{key: value for key, value in item.items() if key != "as_of"} for item in stats]
+
+
+def test_incremental_refresh_matches_live_stats(client, seed_links):
+    """Test that new clicks, links and deletions are applied incrementally and match the live query."""
+    print("\nTesting incremental leaderboard refresh...")
+
+    client.post(f"{BASE_URL}/api/users/", json={"username": "board_user", "password": "board"})
+    codes = seed_links("board_user", links=20, clicks_per_link=5)
+    board = Leaderboard(batch_size=7, safety_lag_seconds=0)
+    invalidation_bus.subscribe(LINK_EVENT, board.mark_dirty)
+    db = SessionLocal()
+    try:
+        board.refresh(db)
+        assert without_as_of(board.snapshot(60)[1]) == LinkService.get_all_enhanced_stats(db)
+
+        for code in codes[:3]:
+            for _ in range(4):
+                assert client.get(f"{BASE_URL}/{code}", follow_redirects=False).status_code == 301
+        created = client.post(f"{BASE_URL}/api/links/", json={"original_url": "https://board.example.com"},
+                              auth=("board_user", "board")).json()
+        assert client.get(f"{BASE_URL}/{created['short_url']}", follow_redirects=False).status_code == 301
+        assert client.delete(f"{BASE_URL}/api/links/{codes[5]}", auth=("board_user", "board")).status_code == 204
+        assert client.put(f"{BASE_URL}/api/links/{codes[6]}", json={"is_active": False},
+                          auth=("board_user", "board")).status_code == 200
+
+        db.expire_all()
+        board.refresh(db)
+        as_of, stats = board.snapshot(60)
+        live = LinkService.get_all_enhanced_stats(db)
+        assert without_as_of(stats) == live
+        by_code = {item["short_url"]: item for item in stats}
+        assert codes[5] not in by_code
+        assert by_code[codes[6]]["is_active"] is False
+        assert by_code[created["short_url"]]["click_count"] == 1
+        assert by_code[codes[0]]["click_count"] == 9
+    finally:
+        invalidation_bus.unsubscribe(LINK_EVENT, board.mark_dirty)
+        db.close()
+    print("Incremental leaderboard refresh works")
+
+
+def test_windows_slide_between_refreshes(client):
+    """Test that clicks leaving a window are subtracted from it at the next refresh."""
+    print("\nTesting leaderboard window sliding...")
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db = SessionLocal()
+    try:
+        link = Link(short_url="boardslide", original_url="https://slide.example.com",
+                    created_by="board_user", expires_at=now + timedelta(days=1), click_count=1)
+        db.add(link)
+        db.flush()
+        db.add(Click(link_id=link.id, clicked_at=now - timedelta(minutes=59)))
+        db.commit()
+
+        board = Leaderboard(safety_lag_seconds=0)
+        board.refresh(db, now=now)
+        stats = {item["short_url"]: item for item in board.snapshot(60, now=now)[1]}
+        assert stats["boardslide"]["last_hour_clicks"] == 1
+
+        later = now + timedelta(minutes=2)
+        board.refresh(db, now=later)
+        stats = {item["short_url"]: item for item in board.snapshot(60, now=later)[1]}
+        assert stats["boardslide"]["last_hour_clicks"] == 0
+        assert stats["boardslide"]["last_day_clicks"] == 1
+        assert stats["boardslide"]["click_count"] == 1
+        assert stats["boardslide"]["windows"]["1h"] == 0
+    finally:
+        db.close()
+    print("Leaderboard window sliding works")
+
+
+def test_stats_served_from_fresh_snapshot(client, count_queries, monkeypatch):
+    """Test that /api/stats uses the snapshot with its as_of and falls back to the live query once stale."""
+    print("\nTesting leaderboard serving...")
+
+    monkeypatch.setattr(settings, "LEADERBOARD_REFRESH_INTERVAL_SECONDS", 5)
+    db = SessionLocal()
+    try:
+        leaderboard.refresh(db)
+    finally:
+        db.close()
+    as_of = leaderboard.snapshot(60)[0]
+
+    with count_queries() as queries:
+        response = client.get(f"{BASE_URL}/api/stats/")
+    assert response.status_code == 200
+    assert queries.count == 0
+    assert response.headers["x-stats-as-of"] == as_of.isoformat()
+    assert all(item["as_of"] == as_of.isoformat() for item in response.json())
+
+    monkeypatch.setattr(settings, "LEADERBOARD_MAX_STALENESS_SECONDS", 0)
+    with count_queries() as queries:
+        response = client.get(f"{BASE_URL}/api/stats/")
+    assert response.status_code == 200
+    assert queries.count == 1
+    assert response.headers["x-stats-as-of"] > as_of.isoformat()
+    print("Leaderboard serving works")
+
+
+def test_invalidated_links_reload_from_primary(tmp_path):
+    """Test that invalidated links are reloaded from the primary while the replica still has the old rows."""
+    print("\nTesting leaderboard reloads behind a lagging replica...")
+
+    engines = {name: create_engine(f"sqlite:///{tmp_path / f'{name}.db'}") for name in ("primary", "replica")}
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for engine in engines.values():
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            db.add_all([Link(id=i + 1, short_url=f"lagging{i}", original_url="https://lag.example.com",
+                             expires_at=now + timedelta(days=1)) for i in range(2)])
+            db.commit()
+    with Session(engines["primary"]) as db:
+        db.get(Link, 1).is_active = False
+        db.get(Link, 2).deleted_at = now
+        db.commit()
+
+    board = Leaderboard(safety_lag_seconds=0)
+    with Session(engines["replica"]) as replica_db, Session(engines["primary"]) as primary_db:
+        board.refresh(replica_db, now=now)
+        # The events of both changes arrive before the replica has them
+        board.mark_dirty("lagging0")
+        board.mark_dirty("lagging1")
+        board.refresh(replica_db, now=now, primary_db=primary_db)
+    stats = {item["short_url"]: item for item in board.snapshot(60, now=now)[1]}
+    assert stats["lagging0"]["is_active"] is False
+    assert "lagging1" not in stats
+    for engine in engines.values():
+        engine.dispose()
+    print("Leaderboard reloads behind a lagging replica work")
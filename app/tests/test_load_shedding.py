@@ -0,0 +1,94 @@
+"""Adaptive load shedding."""
+
+from fastapi.testclient import TestClient
+
+from conftest import BASE_URL
+from core.load_shedding import CRUD, REDIRECT, STATS, AdaptiveConcurrencyLimiter, LoadSheddingMiddleware
+from db import instrumentation
+
+
+def test_limiter_aimd_and_priorities():
+    """Test that the limit grows while used, backs off on latency spikes and saturation, and sheds stats first."""
+    print("\nTesting adaptive concurrency limit...")
+
+    saturation = [0.0]
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, min_limit=2, max_limit=10,
+                                         shares={REDIRECT: 1.0, CRUD: 0.75, STATS: 0.5},
+                                         saturation=lambda: saturation[0])
+    for _ in range(100):
+        limiter.observe_query(0.001)
+
+    # Stats get half of the limit, redirects all of it
+    assert [limiter.try_acquire(STATS) for _ in range(3)] == [True, True, False]
+    assert limiter.try_acquire(CRUD) is True
+    assert limiter.try_acquire(CRUD) is False
+    assert limiter.try_acquire(REDIRECT) is True
+    assert limiter.try_acquire(REDIRECT) is False
+
+    # Additive increase while the limit is fully used
+    limiter.release(now=1.0)
+    assert limiter.limit == 4.25
+
+    # Multiplicative decrease on a latency spike, once per round trip
+    for _ in range(20):
+        limiter.observe_query(0.05)
+    limiter.release(now=2.0)
+    limiter.release(now=2.0)
+    assert limiter.limit == 4.25 * 0.9
+
+    # And when the pool is exhausted, down to the minimum
+    for _ in range(200):
+        limiter.observe_query(0.001)
+    saturation[0] = 1.0
+    for second in range(3, 30):
+        limiter.try_acquire(REDIRECT)
+        limiter.release(now=float(second))
+    assert limiter.limit == 2
+    print("Adaptive concurrency limit works")
+
+
+def test_overloaded_requests_get_503(app, client):
+    """Test that requests over the limit fail fast while cached redirects still succeed."""
+    print("\nTesting load shedding...")
+
+    # Without a context manager the lifespan already run by the session client is not repeated
+    middleware = LoadSheddingMiddleware(app)
+    shedding = TestClient(middleware, base_url=BASE_URL)
+    client.post(f"{BASE_URL}/api/users/", json={"username": "shed_user", "password": "shed"})
+    link = client.post(f"{BASE_URL}/api/links/", json={"original_url": "https://shed.example.com"},
+                       auth=("shed_user", "shed")).json()
+    # Fills the redirect cache
+    assert shedding.get(f"{BASE_URL}/{link['short_url']}", follow_redirects=False).status_code == 301
+
+    middleware.limiter.in_flight = int(middleware.limiter.limit)
+    response = shedding.get(f"{BASE_URL}/api/stats/")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert shedding.get(f"{BASE_URL}/missing-code", follow_redirects=False).status_code == 503
+    assert shedding.get(f"{BASE_URL}/{link['short_url']}", follow_redirects=False).status_code == 301
+    assert shedding.get(f"{BASE_URL}/health").status_code == 200
+
+    middleware.limiter.in_flight = 0
+    assert shedding.get(f"{BASE_URL}/api/stats/").status_code == 200
+    print("Load shedding works")
+
+
+async def lifespan_only_app(scope, receive, send):
+    """Application answering lifespan events and nothing else."""
+    while True:
+        message = await receive()
+        await send({"type": f"{message['type']}.complete"})
+        if message["type"] == "lifespan.shutdown":
+            return
+
+
+def test_query_observer_follows_lifespan():
+    """Test that the limiter observes queries between application startup and shutdown only."""
+    print("\nTesting load shedding observer lifecycle...")
+
+    middleware = LoadSheddingMiddleware(lifespan_only_app)
+    assert middleware.limiter.observe_query not in instrumentation._observers
+    with TestClient(middleware, base_url=BASE_URL):
+        assert middleware.limiter.observe_query in instrumentation._observers
+    assert middleware.limiter.observe_query not in instrumentation._observers
+    print("Load shedding observer lifecycle works")
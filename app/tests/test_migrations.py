@@ -0,0 +1,164 @@
+"""Data migrations of databases created by earlier versions."""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import db.migrations as migrations
+from db.database import Base, SessionLocal
+from models.click import Click
+from models.link import Link
+from models.user_agent import UserAgent
+from services.user_agents import UserAgentRegistry
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE links (id INTEGER PRIMARY KEY, short_url VARCHAR(100) UNIQUE NOT NULL, "
+    "original_url VARCHAR(2000) NOT NULL, is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL, "
+    "expires_at DATETIME NOT NULL, click_count INTEGER NOT NULL, created_by VARCHAR(50))",
+    "CREATE TABLE clicks (id INTEGER PRIMARY KEY, link_id INTEGER NOT NULL REFERENCES links(id), "
+    "clicked_at DATETIME NOT NULL, ip_address VARCHAR(45), user_agent VARCHAR(500))",
+]
+# Postgres-only migrations run against this database, in a schema of their own
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL", "")
+MIGRATION_SCHEMA = "migration_test"
+
+LEGACY_CLICKS = [
+    ("203.0.113.7", "Mozilla/5.0 (X11; Linux x86_64)"),
+    ("2001:db8::1", "curl/8.5.0"),
+    ("not-an-ip", "Mozilla/5.0 (X11; Linux x86_64)"),
+    (None, None),
+    ("198.51.100.20", "curl/8.5.0"),
+]
+
+
+def test_clicks_storage_migration(tmp_path, monkeypatch):
+    """Test that inline IP and user agent strings become packed IPs and de-duplicated user agent ids."""
+    print("\nTesting clicks storage migration...")
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy_engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO links VALUES (1, 'legacy', 'https://legacy.example.com', 1, "
+            "'2024-01-01 00:00:00', '2030-01-01 00:00:00', 5, 'legacy_user')"
+        ))
+        connection.execute(
+            text("INSERT INTO clicks (link_id, clicked_at, ip_address, user_agent) "
+                 "VALUES (1, '2024-01-02 00:00:00', :ip, :user_agent)"),
+            [{"ip": ip, "user_agent": user_agent} for ip, user_agent in LEGACY_CLICKS],
+        )
+    monkeypatch.setattr(migrations, "engine", legacy_engine)
+
+    assert migrations.migrate_clicks_storage(batch_size=2) == len(LEGACY_CLICKS)
+    assert migrations._column_names("clicks") >= {"ip", "user_agent_id"}
+    assert not migrations._column_names("clicks") & {"ip_address", "user_agent"}
+
+    with Session(legacy_engine) as db:
+        clicks = db.query(Click).order_by(Click.id).all()
+        assert [click.ip for click in clicks] == ["203.0.113.7", "2001:db8::1", None, None, "198.51.100.20"]
+        with legacy_engine.connect() as connection:
+            stored = connection.execute(text("SELECT ip FROM clicks ORDER BY id")).scalars().all()
+        assert [len(value) if value else None for value in stored] == [4, 16, None, None, 4]
+
+        agents = {agent.id: agent.value for agent in db.query(UserAgent)}
+        assert sorted(agents.values()) == ["Mozilla/5.0 (X11; Linux x86_64)", "curl/8.5.0"]
+        assert [agents.get(click.user_agent_id) for click in clicks] == [
+            user_agent for _, user_agent in LEGACY_CLICKS
+        ]
+
+    # Running it again finds nothing to convert and leaves the rows alone
+    assert migrations.migrate_clicks_storage(batch_size=2) == 0
+    with Session(legacy_engine) as db:
+        assert db.query(UserAgent).count() == 2
+        assert [click.ip for click in db.query(Click).order_by(Click.id)][:2] == ["203.0.113.7", "2001:db8::1"]
+    legacy_engine.dispose()
+    print("Clicks storage migration works")
+
+
+def test_user_agent_registry_deduplicates(client):
+    """Test that the registry used by redirects maps one user agent string to one row."""
+    print("\nTesting user agent registry...")
+
+    registry = UserAgentRegistry(max_size=10)
+    value = "registry-test-agent/1.0"
+    db = SessionLocal()
+    try:
+        first = registry.get_id(db, value)
+        db.commit()
+        # A fresh registry finds the committed row instead of inserting another one
+        assert UserAgentRegistry(max_size=10).get_id(db, value) == first
+        assert registry.get_id(db, value) == first
+        assert registry.get_id(db, "") is None
+        assert db.query(UserAgent).filter(UserAgent.value == value).count() == 1
+    finally:
+        db.close()
+    print("User agent registry works")
+
+
+class InterruptedEngine:
+    """Engine failing when it is asked for its nth transaction, like a process killed mid-migration."""
+
+    def __init__(self, engine, fail_on: int):
+        self._engine = engine
+        self._fail_on = fail_on
+        self._transactions = 0
+
+    def begin(self):
+        self._transactions += 1
+        if self._transactions == self._fail_on:
+            raise RuntimeError("interrupted")
+        return self._engine.begin()
+
+    def __getattr__(self, name):
+        return getattr(self._engine, name)
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="needs a Postgres database in TEST_POSTGRES_URL")
+def test_clicks_partitioning_resumes(monkeypatch):
+    """Test that an interrupted partitioning migration copies the remaining clicks and finishes when rerun."""
+    print("\nTesting resumed clicks partitioning...")
+
+    admin_engine = create_engine(TEST_POSTGRES_URL)
+    with admin_engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {MIGRATION_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {MIGRATION_SCHEMA}"))
+    pg_engine = create_engine(TEST_POSTGRES_URL, connect_args={"options": f"-csearch_path={MIGRATION_SCHEMA}"})
+    try:
+        Base.metadata.create_all(bind=pg_engine)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with Session(pg_engine) as db:
+            link = Link(short_url="partitioned", original_url="https://partition.example.com",
+                        expires_at=now + timedelta(days=1))
+            db.add(link)
+            db.flush()
+            db.add_all([Click(link_id=link.id, clicked_at=now - timedelta(days=i % 3)) for i in range(5)])
+            db.commit()
+
+        # The table swap and one batch of two clicks are committed, then the process dies
+        monkeypatch.setattr(migrations, "engine", InterruptedEngine(pg_engine, fail_on=3))
+        with pytest.raises(RuntimeError):
+            migrations.migrate_clicks_partitioning(batch_size=2)
+        with pg_engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM clicks_unpartitioned")).scalar() == 3
+
+        monkeypatch.setattr(migrations, "engine", pg_engine)
+        assert migrations.migrate_clicks_partitioning(batch_size=2) == 3
+        with pg_engine.connect() as connection:
+            assert connection.execute(text("SELECT to_regclass('clicks_unpartitioned')")).scalar() is None
+            indexes = connection.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'clicks'"
+            )).scalars().all()
+            assert {"ix_clicks_link_id", "ix_clicks_clicked_at"} <= set(indexes)
+            assert connection.execute(text("SELECT count(*) FROM clicks")).scalar() == 5
+            assert connection.execute(text("SELECT pg_get_serial_sequence('clicks', 'id')")).scalar()
+        assert migrations.migrate_clicks_partitioning(batch_size=2) == 0
+    finally:
+        pg_engine.dispose()
+        with admin_engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {MIGRATION_SCHEMA} CASCADE"))
+        admin_engine.dispose()
+    print("Resumed clicks partitioning works")
@@ -0,0 +1,101 @@
+"""Request profiling middleware."""
+
+import asyncio
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from conftest import BASE_URL
+from core.config import settings
+from core.profiling import OverheadGuard, ProfilingMiddleware
+
+
+def test_profiling_header_writes_tagged_profile(app, client, seed_links, monkeypatch, tmp_path):
+    """Test that an authorized X-Profile header profiles the request and a wrong token does not."""
+    print("\nTesting request profiling...")
+
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "debug-token")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_MAX_FILES", 2)
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    # Without a context manager the lifespan already run by the session client is not repeated
+    profiled = TestClient(ProfilingMiddleware(app), base_url=BASE_URL)
+    seed_links("profiling", links=50, clicks_per_link=20)
+
+    response = profiled.get(f"{BASE_URL}/api/stats/", headers={"X-Profile": "wrong-token"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+    for _ in range(3):
+        response = profiled.get(f"{BASE_URL}/api/stats/", headers={"X-Profile": "debug-token"})
+        assert response.status_code == 200
+    name = response.headers["x-profile-id"]
+
+    # Only the newest profiles are kept
+    assert sorted(os.listdir(tmp_path))[-2:] == [f"{name}.collapsed", f"{name}.json"]
+    assert len(os.listdir(tmp_path)) == 4
+    with open(tmp_path / f"{name}.json") as f:
+        metadata = json.load(f)
+    assert metadata["route"] == "/api/stats/"
+    assert metadata["status_code"] == 200
+    assert metadata["query_count"] == 1
+    assert metadata["triggered_by"] == "header"
+    with open(tmp_path / f"{name}.collapsed") as f:
+        for line in f:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0 and ";" in stack
+    print("Request profiling works")
+
+
+async def slow_app(scope, receive, send):
+    """Request spending 300 ms on the event loop."""
+    await asyncio.sleep(0.3)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_overhead_guard_carries_debt():
+    """Test that a cost larger than the budget is paid back with wall time before profiling resumes."""
+    print("\nTesting profiling overhead debt...")
+
+    guard = OverheadGuard(max_fraction=0.5, window_seconds=2)
+    assert guard.allow()
+    guard.record(3.0)
+    assert guard.remaining() < -1.9
+    # Two seconds of wall time refill one second of budget
+    guard._updated -= 2
+    assert not guard.allow()
+    guard._updated -= 4
+    assert guard.allow()
+    # The balance never grows beyond a window's worth
+    assert guard.remaining() <= 1.0
+    print("Profiling overhead debt works")
+
+
+def test_profiles_stop_when_budget_is_spent(monkeypatch, tmp_path):
+    """Test that both profilers stop mid-request once the budget is used up."""
+    print("\nTesting profiling overhead cap...")
+
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "debug-token")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    # Refills 0.3 ms during the request
+    monkeypatch.setattr(settings, "PROFILE_MAX_OVERHEAD", 0.001)
+    headers = {"X-Profile": "debug-token"}
+    for mode in ("cprofile", "sampling"):
+        monkeypatch.setattr(settings, "PROFILE_MODE", mode)
+        middleware = ProfilingMiddleware(slow_app)
+        # Half a millisecond of budget left, less than the samples of the request cost
+        middleware.guard.record(middleware.guard.remaining() - 0.0005)
+        profiled = TestClient(middleware, base_url=BASE_URL)
+
+        response = profiled.get(f"{BASE_URL}/slow", headers=headers)
+        with open(tmp_path / f"{response.headers['x-profile-id']}.json") as f:
+            metadata = json.load(f)
+        assert metadata["truncated"] is True
+        assert metadata["duration_ms"] >= 300
+        # About what was left was spent, not the 300 ms of the request
+        assert -0.05 < middleware.guard.remaining() < 0.002
+    print("Profiling overhead cap works")
@@ -0,0 +1,50 @@
+"""Background purge of deleted links."""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from db.database import Base
+from models.click import Click
+from models.click_aggregate import ClickDailyAggregate
+from models.click_counter import LinkClickShard
+from models.link import Link
+from services.link_purger import LinkPurger
+
+
+def test_purge_removes_deleted_links(tmp_path):
+    """Test that deleted links lose their row, clicks, shards and aggregates while live links keep theirs."""
+    print("\nTesting link purge...")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'purge.db'}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with Session(engine) as db:
+        links = [Link(short_url=f"purge{i}", original_url="https://purge.example.com",
+                      expires_at=now + timedelta(days=1), deleted_at=now if i < 2 else None) for i in range(3)]
+        db.add_all(links)
+        db.flush()
+        # The first deleted link has enough clicks for several batches, the second has none
+        for link, clicks in zip(links, (5, 0, 2)):
+            db.add_all([Click(link_id=link.id, clicked_at=now) for _ in range(clicks)])
+            db.add(LinkClickShard(link_id=link.id, shard=0, count=clicks))
+            db.add(ClickDailyAggregate(link_id=link.id, day=now.replace(hour=0, minute=0, second=0, microsecond=0),
+                                       clicks=clicks, last_clicked_at=now))
+        db.commit()
+        live_id = links[2].id
+
+        progress = LinkPurger(batch_size=2).purge(db)
+        assert (progress.links_pending, progress.links_purged, progress.clicks_deleted) == (0, 2, 5)
+        assert progress.current_link_id is None and progress.errors == []
+        assert progress.started_at <= progress.finished_at
+        assert abs(progress.finished_at - now) < timedelta(minutes=1)
+
+        assert [link.id for link in db.query(Link)] == [live_id]
+        for model in (Click, LinkClickShard, ClickDailyAggregate):
+            assert {row.link_id for row in db.query(model)} == {live_id}
+        assert db.query(Click).count() == 2
+
+        assert LinkPurger(batch_size=2).purge(db).links_purged == 0
+    engine.dispose()
+    print("Link purge works")
@@ -0,0 +1,57 @@
+"""Token bucket rate limiting."""
+
+import base64
+
+from fastapi.testclient import TestClient
+
+from conftest import BASE_URL
+from core.config import settings
+from core.rate_limit import RateLimitMiddleware, TokenBucketLimiter
+
+
+def test_token_bucket_refill_and_eviction():
+    """Test refilling, Retry-After and bounded bookkeeping of the limiter."""
+    print("\nTesting token buckets...")
+
+    limiter = TokenBucketLimiter(rate=2, burst=3, max_keys=2)
+    assert [limiter.acquire("a", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a", now=0.0) == 0.5
+    assert limiter.acquire("a", now=0.5) == 0.0
+
+    # Oldest keys are evicted once the limiter is full
+    limiter.acquire("b", now=0.5)
+    limiter.acquire("c", now=0.5)
+    assert len(limiter) == 2
+    # Idle buckets are full again and are forgotten
+    limiter.acquire("d", now=10.0)
+    assert len(limiter) == 1
+    print("Token buckets work")
+
+
+def test_rate_limited_redirects_and_creates(app, client, monkeypatch):
+    """Test that clients over their rate get 429 with Retry-After, per IP and per verified user."""
+    print("\nTesting rate limiting...")
+
+    monkeypatch.setattr(settings, "REDIRECT_RATE_LIMIT_PER_SECOND", 0.1)
+    monkeypatch.setattr(settings, "REDIRECT_RATE_LIMIT_BURST", 3)
+    monkeypatch.setattr(settings, "CREATE_RATE_LIMIT_PER_SECOND", 0.1)
+    monkeypatch.setattr(settings, "CREATE_RATE_LIMIT_BURST", 2)
+    # Without a context manager the lifespan already run by the session client is not repeated
+    limited = TestClient(RateLimitMiddleware(app), base_url=BASE_URL)
+
+    statuses = [limited.get(f"{BASE_URL}/missing-code", follow_redirects=False).status_code for _ in range(4)]
+    assert statuses == [404, 404, 404, 429]
+    response = limited.get(f"{BASE_URL}/missing-code", follow_redirects=False)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    # Other routes are not limited
+    assert limited.get(f"{BASE_URL}/health").status_code == 200
+
+    client.post(f"{BASE_URL}/api/users/", json={"username": "limited_user", "password": "limited"})
+    headers = {"Authorization": "Basic " + base64.b64encode(b"limited_user:limited").decode()}
+    link_data = {"original_url": "https://limited.example.com"}
+    # The first request is keyed by IP, later ones by the verified username
+    statuses = [limited.post(f"{BASE_URL}/api/links/", json=link_data, headers=headers).status_code
+                for _ in range(4)]
+    assert statuses == [201, 201, 201, 429]
+    print("Rate limiting works")
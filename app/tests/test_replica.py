@@ -0,0 +1,102 @@
+"""Redirect lookups on a read replica."""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import api.deps as deps
+from core.config import settings
+import db.database as database
+from db.database import Base, ReplicaLagMonitor, SessionLocal
+from models.click import Click
+from models.click_counter import LinkClickShard
+from models.link import Link
+from services.cache import redirect_cache
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """A second SQLite file standing in for the replica, used as the read engine."""
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=replica_engine)
+    monitor = ReplicaLagMonitor(check_interval_seconds=0)
+    monkeypatch.setattr(database, "read_engine", replica_engine)
+    monkeypatch.setattr(deps, "read_engine", replica_engine)
+    monkeypatch.setattr(deps, "ReadSessionLocal", sessionmaker(bind=replica_engine))
+    monkeypatch.setattr(deps, "replica_lag_monitor", monitor)
+    yield replica_engine, monitor
+    replica_engine.dispose()
+
+
+def add_link(db: Session, short_url: str, original_url: str, link_id: int = None) -> Link:
+    link = Link(id=link_id, short_url=short_url, original_url=original_url, created_by="replica_user",
+                expires_at=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1))
+    db.add(link)
+    db.commit()
+    return link
+
+
+def redirect_target(client, short_url: str) -> str:
+    redirect_cache.invalidate(short_url)
+    response = client.get(f"/{short_url}", follow_redirects=False)
+    assert response.status_code == 301
+    return response.headers["location"]
+
+
+def test_redirects_read_from_replica(client, replica, monkeypatch):
+    """Test that redirects read the replica, fall back to the primary when it lags, and write to the primary."""
+    print("\nTesting redirects on a replica...")
+
+    replica_engine, monitor = replica
+    # The copies differ only to tell which database answered
+    with SessionLocal() as db:
+        link_id = add_link(db, "replicated", "https://primary.example.com/").id
+        add_link(db, "fresh", "https://primary.example.com/fresh")
+    with Session(replica_engine) as db:
+        add_link(db, "replicated", "https://replica.example.com/", link_id=link_id)
+
+    assert redirect_target(client, "replicated") == "https://replica.example.com/"
+    # Not replicated yet, found on the primary
+    assert redirect_target(client, "fresh") == "https://primary.example.com/fresh"
+
+    monkeypatch.setattr(monitor, "_measure", lambda: settings.REPLICA_MAX_LAG_SECONDS + 1)
+    assert redirect_target(client, "replicated") == "https://primary.example.com/"
+    monkeypatch.setattr(monitor, "_measure", lambda: 0.0)
+    assert redirect_target(client, "replicated") == "https://replica.example.com/"
+
+    with SessionLocal() as db:
+        assert db.query(Click).filter(Click.link_id == link_id).count() == 3
+        assert db.query(LinkClickShard).filter(LinkClickShard.link_id == link_id).count() > 0
+    with Session(replica_engine) as db:
+        assert db.query(Click).count() == 0
+        assert db.query(LinkClickShard).count() == 0
+    print("Redirects on a replica work")
+
+
+def test_lag_measurement_does_not_block_readers(replica, monkeypatch):
+    """Test that callers use the previous lag while another one is measuring."""
+    print("\nTesting replica lag monitor...")
+
+    _, monitor = replica
+    measuring = threading.Event()
+    release = threading.Event()
+
+    def slow_measure():
+        measuring.set()
+        release.wait(timeout=5)
+        return 7.0
+
+    monkeypatch.setattr(monitor, "_measure", slow_measure)
+    measurer = threading.Thread(target=monitor.lag_seconds)
+    measurer.start()
+    try:
+        assert measuring.wait(timeout=5)
+        assert monitor.lag_seconds() == 0.0
+    finally:
+        release.set()
+        measurer.join()
+    assert monitor.lag_seconds() == 7.0
+    print("Replica lag monitor works")